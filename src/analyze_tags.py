@@ -126,8 +126,11 @@
 
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Set, Optional
+import typer
 from rich.console import Console
+import note_mirror
+from part_files import read_part, is_part_file
 
 # --- Configuration ---
 # CHANGED: Now points to the directory containing all input files
@@ -162,19 +165,50 @@ def print_issue_details(title: str, issues: List[Dict[str, Any]]):
             console.print(f"  - [bold]Note ID:[/] {issue['noteId']}")
             console.print(f"    [bold]Tags:[/] {issue['tags']}\n")
 
-def find_tagging_issues():
-    """
-    Analyzes notes for multiple, missing, or malformed subject tags based on a predefined list
-    and generates a consolidated Anki search query. It processes all .json files in INPUT_DIR.
-    """
+# --- Tag rules (shared with other tools) ---
+ISSUE_MULTIPLE = "multiple"    # More than one correctly formatted subject tag
+ISSUE_MALFORMED = "malformed"  # A subject from VALID_SUBJECTS without "::Topic"
+ISSUE_MISSING = "missing"      # No subject tag at all
+
+def classify_tag_issues(tags: List[str]) -> Set[str]:
+    """Return the set of tag issues for one note (empty set means the tags are fine)."""
+    # Category 1: Correctly formatted subject tags (e.g., "MATH::Algebra")
+    subject_tags = [tag for tag in tags if tag.count("::") == 1]
+
+    # Category 2: Malformed subject tags (e.g., "MATH" but not "MATH::Topic")
+    malformed_tags = [tag for tag in tags if tag in VALID_SUBJECTS]
+
+    issues = set()
+    # Case 1: More than one correctly formatted subject tag
+    if len(subject_tags) > 1:
+        issues.add(ISSUE_MULTIPLE)
+    # Case 2: A tag exists from your list but without "::"
+    if malformed_tags:
+        issues.add(ISSUE_MALFORMED)
+    # Case 3: No valid subject tags AND no malformed subject tags are found
+    if not subject_tags and not malformed_tags:
+        issues.add(ISSUE_MISSING)
+    return issues
+
+# --- Note sources ---
+def load_notes_from_mirror(deck: str) -> List[Dict[str, Any]]:
+    """Load noteId/Tags pairs for a deck from the local SQLite mirror (indexed query, no JSON parsing)."""
+    conn = note_mirror.connect()
+    try:
+        return [{"noteId": nid, "Tags": tags} for nid, tags in note_mirror.tags_for_deck(conn, deck).items()]
+    finally:
+        conn.close()
+
+def load_notes_from_input_dir() -> List[Dict[str, Any]]:
+    """Load and consolidate notes from all .json / .jsonl part files in INPUT_DIR."""
     if not INPUT_DIR.is_dir():
         log_error(f"Input directory not found at: {INPUT_DIR}")
-        return
+        return []
 
-    input_files = list(INPUT_DIR.glob('*.json'))
+    input_files = [p for p in INPUT_DIR.glob('*.json*') if is_part_file(p)]
     if not input_files:
         log_warn(f"No .json files found in {INPUT_DIR}. Exiting.")
-        return
+        return []
 
     log_task(f"Found {len(input_files)} JSON files in {INPUT_DIR}.")
 
@@ -184,10 +218,9 @@ def find_tagging_issues():
     for file_path in input_files:
         log_info(f"Loading notes from {file_path}...")
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                notes_from_file: List[Dict[str, Any]] = json.load(f)
-                all_notes.extend(notes_from_file)
-                log_info(f"Loaded {len(notes_from_file)} notes from {file_path}.")
+            notes_from_file: List[Dict[str, Any]] = read_part(file_path)
+            all_notes.extend(notes_from_file)
+            log_info(f"Loaded {len(notes_from_file)} notes from {file_path}.")
         except json.JSONDecodeError as e:
             log_error(f"Failed to decode JSON from {file_path}. Error: {e}")
             # Continue to the next file if one fails
@@ -197,9 +230,26 @@ def find_tagging_issues():
 
     if not all_notes:
         log_error("No notes were successfully loaded from any of the input files. Exiting.")
-        return
+    return all_notes
 
-    log_info(f"Successfully loaded a total of {len(all_notes)} notes from all files. Analyzing for tag issues...")
+def find_tagging_issues(deck: Optional[str] = None):
+    """
+    Analyzes notes for multiple, missing, or malformed subject tags based on a predefined list
+    and generates a consolidated Anki search query. It processes all .json files in INPUT_DIR,
+    or the notes of `deck` in the local SQLite mirror when a deck is given.
+    """
+    if deck:
+        log_task(f'Loading notes of deck "{deck}" from mirror {note_mirror.MIRROR_PATH}...')
+        all_notes = load_notes_from_mirror(deck)
+        if not all_notes:
+            log_warn(f'No notes for deck "{deck}" in the mirror. Run fetch_notes.py --incremental first.')
+            return
+        log_info(f"Loaded {len(all_notes)} notes from the mirror. Analyzing for tag issues...")
+    else:
+        all_notes = load_notes_from_input_dir()
+        if not all_notes:
+            return
+        log_info(f"Successfully loaded a total of {len(all_notes)} notes from all files. Analyzing for tag issues...")
 
     # --- 2. Categorize notes with issues ---
     issues_multiple_subjects = []
@@ -214,30 +264,16 @@ def find_tagging_issues():
         if not note_id or not isinstance(tags, list):
             continue
 
-        # Category 1: Correctly formatted subject tags (e.g., "MATH::Algebra")
-        subject_tags = [tag for tag in tags if tag.count("::") == 1]
-        
-        # Category 2: Malformed subject tags (e.g., "MATH" but not "MATH::Topic")
-        malformed_tags = [tag for tag in tags if tag in VALID_SUBJECTS]
-
         # --- Categorize issues and collect note IDs ---
-        is_problem = False
-        # Case 1: More than one correctly formatted subject tag
-        if len(subject_tags) > 1:
+        issues = classify_tag_issues(tags)
+        if ISSUE_MULTIPLE in issues:
             issues_multiple_subjects.append({"noteId": note_id, "tags": tags})
-            is_problem = True
-
-        # Case 2: A tag exists from your list but without "::"
-        if malformed_tags:
+        if ISSUE_MALFORMED in issues:
             issues_malformed_subject.append({"noteId": note_id, "tags": tags})
-            is_problem = True
-        
-        # Case 3: No valid subject tags AND no malformed subject tags are found
-        if not subject_tags and not malformed_tags:
+        if ISSUE_MISSING in issues:
             issues_missing_subject.append({"noteId": note_id, "tags": tags})
-            is_problem = True
 
-        if is_problem:
+        if issues:
             all_problematic_nids.add(note_id)
 
     # --- 3. Report the findings ---
@@ -262,5 +298,21 @@ def find_tagging_issues():
         log_task("Copy the line below and paste it into the Anki search bar:")
         console.print(anki_search_query, style="bold")
 
+# --- CLI ---
+app = typer.Typer(
+    help="Audits subject tags of fetched notes and prints an Anki search query for the problematic ones.",
+    add_completion=False,
+)
+
+@app.command()
+def main(
+    deck: Optional[str] = typer.Option(
+        None,
+        "--deck", "-d",
+        help="Audit this deck from the local SQLite mirror instead of the .json files in ./data/input/."
+    )
+):
+    find_tagging_issues(deck)
+
 if __name__ == "__main__":
-    find_tagging_issues()
\ No newline at end of file
+    app()
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+try:
+    import httpx  # Optional: only needed for the async client
+except ImportError:
+    httpx = None
+
+import metrics
+import anki_client
+from anki_client import (
+    ActionStats, AnkiConnectError, ANKI_API_VERSION, CONNECT_TIMEOUT, READ_TIMEOUT, POOL_SIZE, NOTES_INFO_BATCH_SIZE,
+)
+
+# --- CONFIGURATION ---
+CONCURRENCY = 4  # AnkiConnect requests in flight at once on the async client
+
+T = TypeVar("T")
+
+
+# --- Client ---
+class AsyncAnkiClient:
+    """
+    asyncio counterpart of anki_client.AnkiClient, backed by one pooled httpx.AsyncClient.
+    Same surface (request / multi) and the same per-action stats, so the existing
+    summary lines keep working. Use as `async with AsyncAnkiClient() as client: ...`.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        pool_size: int = POOL_SIZE,
+        stats: Optional[ActionStats] = None,
+    ):
+        if httpx is None:
+            raise RuntimeError("The async AnkiConnect client needs httpx (pip install httpx).")
+        default = anki_client.get_client()
+        self.url = url or default.url
+        # Share the process-wide counters unless told otherwise
+        self.stats = stats if stats is not None else default.stats
+        self.session = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def __aenter__(self) -> "AsyncAnkiClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def request(self, action: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Send a single action and return its 'result'. Raises AnkiConnectError on API errors."""
+        if params is None:
+            params = {}
+        payload = {"action": action, "version": ANKI_API_VERSION, "params": params}
+        body = json.dumps(payload).encode("utf-8")
+        start = time.perf_counter()
+        ok = False
+        try:
+            with metrics.span(f"anki.{action}", "anki"):
+                response = await self.session.post(
+                    self.url, content=body, headers={"Content-Type": "application/json"}
+                )
+            response.raise_for_status()
+            metrics.count("anki.requests")
+            metrics.count("anki.bytes_sent", len(body))
+            metrics.count("anki.bytes_received", len(response.content))
+            with metrics.span("parse.anki_response", "parse"):
+                result = response.json()
+            if result.get("error"):
+                raise AnkiConnectError(result["error"])
+            ok = True
+            return result.get("result")
+        finally:
+            self.stats.record(action, time.perf_counter() - start, ok)
+
+    async def multi(self, actions: List[Dict[str, Any]]) -> List[Tuple[Any, Optional[str]]]:
+        """Send several actions in one 'multi' round trip. Returns one (result, error) pair per action."""
+        wrapped = [
+            {"action": a["action"], "version": ANKI_API_VERSION, "params": a.get("params", {})}
+            for a in actions
+        ]
+        raw_results = await self.request("multi", {"actions": wrapped})
+        results: List[Tuple[Any, Optional[str]]] = []
+        for item in raw_results or []:
+            if isinstance(item, dict) and set(item.keys()) == {"result", "error"}:
+                results.append((item["result"], item["error"]))
+            else:
+                results.append((item, None))
+        if len(results) != len(actions):
+            raise AnkiConnectError(
+                f"multi returned {len(results)} result(s) for {len(actions)} action(s)"
+            )
+        return results
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+# --- Async bulk operations ---
+async def notes_info_batches(
+    client: AsyncAnkiClient,
+    note_ids: List[int],
+    batch_size: int = NOTES_INFO_BATCH_SIZE,
+    concurrency: int = CONCURRENCY,
+) -> AsyncIterator[List[dict]]:
+    """Yield notesInfo batches in note ID order while up to `concurrency` batches are in flight."""
+    batch_size = max(1, batch_size)
+    concurrency = max(1, concurrency)
+    in_flight: Deque[asyncio.Task] = deque()
+    for i in range(0, len(note_ids), batch_size):
+        if len(in_flight) >= concurrency:
+            yield await in_flight.popleft()
+        in_flight.append(asyncio.ensure_future(client.request("notesInfo", {"notes": note_ids[i:i + batch_size]})))
+    while in_flight:
+        yield await in_flight.popleft()
+
+
+async def fetch_notes_info_map(
+    client: AsyncAnkiClient,
+    note_ids: List[int],
+    batch_size: int = NOTES_INFO_BATCH_SIZE,
+    concurrency: int = CONCURRENCY,
+) -> Dict[int, dict]:
+    """Async variant of anki_client.fetch_notes_info_map."""
+    notes_by_id: Dict[int, dict] = {}
+    async for batch in notes_info_batches(client, note_ids, batch_size, concurrency):
+        for note in batch:
+            if note and note.get("noteId") is not None:
+                notes_by_id[note["noteId"]] = note
+    return notes_by_id
+
+
+async def apply_batch(client: AsyncAnkiClient, batch: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Async variant of anki_updater.apply_batch: one error message (or None) per operation."""
+    if len(batch) == 1:
+        try:
+            await client.request(batch[0]["action"], batch[0]["params"])
+            return [None]
+        except Exception as e:
+            return [str(e)]
+    try:
+        results = await client.multi([{"action": op["action"], "params": op["params"]} for op in batch])
+    except Exception as e:
+        return [str(e)] * len(batch)
+    return [str(error) if error else None for _, error in results]
+
+
+async def apply_batches(
+    client: AsyncAnkiClient,
+    batches: List[List[Dict[str, Any]]],
+    concurrency: int = CONCURRENCY,
+) -> List[List[Optional[str]]]:
+    """Apply many batches with at most `concurrency` requests in flight. Results keep batch order."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(batch):
+        async with semaphore:
+            return await apply_batch(client, batch)
+
+    return await asyncio.gather(*(bounded(batch) for batch in batches))
+
+
+# --- Bridge for the synchronous tools ---
+class AsyncRunner:
+    """
+    Owns a private event loop and one AsyncAnkiClient so synchronous code (the Typer
+    commands) can schedule coroutines and collect their results in order.
+    Scheduled tasks keep running whenever the loop is driven by wait().
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE):
+        self.loop = asyncio.new_event_loop()
+        self.client = self.loop.run_until_complete(self._make_client(pool_size))
+
+    @staticmethod
+    async def _make_client(pool_size: int) -> AsyncAnkiClient:
+        return AsyncAnkiClient(pool_size=pool_size)
+
+    def submit(self, coro: Awaitable[T]) -> "asyncio.Future[T]":
+        return asyncio.ensure_future(coro, loop=self.loop)
+
+    def wait(self, task: Awaitable[T]) -> T:
+        return self.loop.run_until_complete(task)
+
+    def close(self):
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.close()
+
+
+def iter_notes_info(
+    note_ids: List[int],
+    batch_size: int = NOTES_INFO_BATCH_SIZE,
+    concurrency: int = CONCURRENCY,
+) -> Iterator[List[dict]]:
+    """Synchronous generator over notesInfo batches, pipelined on the async client."""
+    runner = AsyncRunner(pool_size=max(POOL_SIZE, concurrency))
+    batches = notes_info_batches(runner.client, note_ids, batch_size, concurrency)
+    try:
+        while True:
+            try:
+                yield runner.wait(batches.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        runner.wait(batches.aclose())
+        runner.close()
+
+
+def fetch_notes_info_map_sync(
+    note_ids: List[int],
+    batch_size: int = NOTES_INFO_BATCH_SIZE,
+    concurrency: int = CONCURRENCY,
+) -> Dict[int, dict]:
+    """Run fetch_notes_info_map on a private loop (for callers without an event loop)."""
+    runner = AsyncRunner(pool_size=max(POOL_SIZE, concurrency))
+    try:
+        return runner.wait(fetch_notes_info_map(runner.client, note_ids, batch_size, concurrency))
+    finally:
+        runner.close()
@@ -0,0 +1,209 @@
+import json
+import os
+import time
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# --- CONFIGURATION ---
+ANKI_URL = os.environ.get("ANKI_CONNECT_URL", "http://localhost:8765")  # AnkiConnect URL (env override for fakes/benchmarks)
+ANKI_API_VERSION = 6
+CONNECT_TIMEOUT = 3.0               # Seconds to wait for the TCP connection
+READ_TIMEOUT = 120.0                # Seconds to wait for AnkiConnect to answer (big notesInfo calls are slow)
+POOL_SIZE = 8                       # Keep-alive connections kept open to AnkiConnect
+NOTES_INFO_BATCH_SIZE = 500         # Note IDs per notesInfo request when fetching in bulk
+
+
+class AnkiConnectError(Exception):
+    """Raised when AnkiConnect answers with a non-empty 'error' field."""
+
+
+# --- Per-action latency counters ---
+class ActionStats:
+    """Thread-safe call counts and cumulative latency per AnkiConnect action."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, action: str, elapsed: float, ok: bool = True):
+        with self._lock:
+            entry = self._stats.setdefault(
+                action, {"calls": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0}
+            )
+            entry["calls"] += 1
+            entry["total_s"] += elapsed
+            entry["max_s"] = max(entry["max_s"], elapsed)
+            if not ok:
+                entry["errors"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return a copy of the counters with an added average latency per action."""
+        with self._lock:
+            result = {}
+            for action, entry in self._stats.items():
+                calls = entry["calls"] or 1
+                result[action] = {**entry, "avg_s": entry["total_s"] / calls}
+            return result
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return int(sum(entry["calls"] for entry in self._stats.values()))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# --- Client ---
+class AnkiClient:
+    """
+    AnkiConnect client backed by a persistent requests.Session.
+    Connections are kept alive and pooled, so repeated calls skip the TCP handshake.
+    """
+
+    def __init__(
+        self,
+        url: str = ANKI_URL,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        pool_size: int = POOL_SIZE,
+    ):
+        self.url = url
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.stats = ActionStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, action: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Send a single action and return its 'result'. Raises AnkiConnectError on API errors."""
+        if params is None:
+            params = {}
+        payload = {"action": action, "version": ANKI_API_VERSION, "params": params}
+        body = json.dumps(payload).encode("utf-8")
+        start = time.perf_counter()
+        ok = False
+        try:
+            with metrics.span(f"anki.{action}", "anki"):
+                response = self.session.post(
+                    self.url, data=body, headers={"Content-Type": "application/json"}, timeout=self.timeout
+                )
+            response.raise_for_status()
+            metrics.count("anki.requests")
+            metrics.count("anki.bytes_sent", len(body))
+            metrics.count("anki.bytes_received", len(response.content))
+            with metrics.span("parse.anki_response", "parse"):
+                result = response.json()
+            if result.get("error"):
+                raise AnkiConnectError(result["error"])
+            ok = True
+            return result.get("result")
+        finally:
+            self.stats.record(action, time.perf_counter() - start, ok)
+
+    def multi(self, actions: List[Dict[str, Any]]) -> List[Tuple[Any, Optional[str]]]:
+        """
+        Send several actions in one 'multi' round trip.
+        Returns one (result, error) pair per action, in the same order as `actions`.
+        """
+        wrapped = [
+            {"action": a["action"], "version": ANKI_API_VERSION, "params": a.get("params", {})}
+            for a in actions
+        ]
+        raw_results = self.request("multi", {"actions": wrapped})
+        results: List[Tuple[Any, Optional[str]]] = []
+        for item in raw_results or []:
+            # With version >= 6 every item is wrapped as {"result": ..., "error": ...}
+            if isinstance(item, dict) and set(item.keys()) == {"result", "error"}:
+                results.append((item["result"], item["error"]))
+            else:
+                results.append((item, None))
+        if len(results) != len(actions):
+            raise AnkiConnectError(
+                f"multi returned {len(results)} result(s) for {len(actions)} action(s)"
+            )
+        return results
+
+    def close(self):
+        self.session.close()
+
+
+# --- Module-level default client (shared by all tools) ---
+_default_client: Optional[AnkiClient] = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> AnkiClient:
+    """Return the process-wide client, creating it on first use."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = AnkiClient()
+        return _default_client
+
+
+def configure(
+    url: str = ANKI_URL,
+    connect_timeout: float = CONNECT_TIMEOUT,
+    read_timeout: float = READ_TIMEOUT,
+    pool_size: int = POOL_SIZE,
+) -> AnkiClient:
+    """Replace the process-wide client (e.g. to point at another URL or change timeouts)."""
+    global _default_client
+    with _default_lock:
+        if _default_client is not None:
+            _default_client.close()
+        _default_client = AnkiClient(url, connect_timeout, read_timeout, pool_size)
+        return _default_client
+
+
+def anki_request(action: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    return get_client().request(action, params)
+
+
+def invoke(action: str, **params) -> Any:
+    return get_client().request(action, params)
+
+
+def anki_multi(actions: List[Dict[str, Any]]) -> List[Tuple[Any, Optional[str]]]:
+    return get_client().multi(actions)
+
+
+# --- Bulk helpers ---
+def iter_notes_info(note_ids: List[int], batch_size: int = NOTES_INFO_BATCH_SIZE) -> Iterator[List[dict]]:
+    """Yield notesInfo results for `note_ids`, one list per batch of at most `batch_size` IDs."""
+    batch_size = max(1, batch_size)
+    for i in range(0, len(note_ids), batch_size):
+        yield anki_request("notesInfo", {"notes": note_ids[i:i + batch_size]})
+
+
+def fetch_notes_info_map(note_ids: List[int], batch_size: int = NOTES_INFO_BATCH_SIZE) -> Dict[int, dict]:
+    """Fetch notesInfo for all `note_ids` in a few batched calls and index it by noteId."""
+    notes_by_id: Dict[int, dict] = {}
+    for batch in iter_notes_info(note_ids, batch_size):
+        for note in batch:
+            # notesInfo returns an empty object for IDs that no longer exist
+            if note and note.get("noteId") is not None:
+                notes_by_id[note["noteId"]] = note
+    return notes_by_id
+
+
+def action_stats() -> Dict[str, Dict[str, float]]:
+    return get_client().stats.snapshot()
+
+
+def format_action_stats() -> List[str]:
+    """One human-readable line per action, slowest total first."""
+    lines = []
+    stats = action_stats()
+    for action, entry in sorted(stats.items(), key=lambda kv: kv[1]["total_s"], reverse=True):
+        lines.append(
+            f"{action}: {int(entry['calls'])} call(s), {int(entry['errors'])} error(s), "
+            f"total {entry['total_s']:.2f}s, avg {entry['avg_s'] * 1000:.1f}ms, max {entry['max_s'] * 1000:.1f}ms"
+        )
+    return lines
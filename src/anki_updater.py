@@ -1,17 +1,29 @@
 import json
+import html
+import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Deque, Tuple
 import typer
 from rich.console import Console
-import requests
 import subprocess # <--- ADDED: Import subprocess for running external scripts
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import anki_async
+import anki_client
+import note_mirror
+import metrics
+from part_files import read_part
+from anki_client import anki_request, anki_multi, fetch_notes_info_map, format_action_stats, NOTES_INFO_BATCH_SIZE
 
 # --- CONFIGURATION ---
-ANKI_URL = "http://localhost:8765"  # AnkiConnect
 TARGET_IDS_FILE = Path("./data/input/input.json")    # noteIds to update
 UPDATE_DATA_FILE = Path("./data/output/output.json") # data with Answer / Solution / newTag
 ALLOWED_SUBJECTS = ["MATH", "GK", "GI", "ENG", "BENG", "COMPUTER"]
+UPDATE_FIELDS = ("Answer", "Solution")  # Note fields output.json entries may set (besides newTag)
 MERGE_SCRIPT_PATH = Path("src/merge_json.py") # <--- ADDED: Path to the merge script
+BATCH_SIZE = 50  # Updates packed into one AnkiConnect 'multi' request (1 = one request per note)
+MAX_IN_FLIGHT = 1  # Concurrent AnkiConnect write requests (1 = strictly sequential)
 
 # --- Logging Helpers ---
 console = Console()
@@ -22,29 +34,30 @@ def log_error(error): console.print(f"[-] {str(error)}", style="bold red")
 def log_info(message): console.print(f"[i] {message}", style="cyan")
 def log_task(message): console.print(f"[*] {message}", style="magenta")
 
-# --- AnkiConnect helpers ---
-def anki_request(action: str, params: Optional[Dict[str, Any]] = None):
-    try:
-        if params is None:
-            params = {}
-        response = requests.post(
-            ANKI_URL, json={"action": action, "version": 6, "params": params}
-        )
-        response.raise_for_status()
-        result = response.json()
-        if result.get("error"):
-            raise Exception(result["error"])
-        return result.get("result")
-    except Exception as e:
-        raise e
+# --- No-op detection ---
+def normalize_field_value(value: str) -> str:
+    """Normalize a field value for comparison: decode HTML entities and collapse whitespace."""
+    text = html.unescape(str(value)).replace("\u00a0", " ")
+    return re.sub(r"\s+", " ", text).strip()
 
-# --- Update field (Answer / Solution) ---
-def update_note_field(note_id: int, field_name: str, new_value: str):
-    note_info = anki_request("notesInfo", {"notes": [note_id]})
+def field_unchanged(note_info: Optional[dict], field_name: str, new_value: str) -> bool:
+    """True if the note already holds `new_value` in `field_name` (after normalization)."""
+    if not note_info:
+        return False
+    field = note_info.get("fields", {}).get(field_name)
+    if field is None:
+        return False
+    return normalize_field_value(field.get("value", "")) == normalize_field_value(new_value)
+
+# --- Build write operations (Answer / Solution / newTag) ---
+# Each builder resolves the note from prefetched notesInfo data and returns an
+# AnkiConnect action dict ({"action": ..., "params": ...}) so it can be sent on
+# its own or packed into a 'multi' batch.
+def build_field_update(note_id: int, field_name: str, new_value: str, note_info: Optional[dict]) -> Dict[str, Any]:
     if not note_info:
         raise Exception(f"Note {note_id} not found.")
 
-    fields = note_info[0].get("fields", {})
+    fields = note_info.get("fields", {})
     if field_name not in fields:
         raise Exception(
             f"Field '{field_name}' not found in note {note_id}. "
@@ -54,16 +67,32 @@ def update_note_field(note_id: int, field_name: str, new_value: str):
     updated_fields = {
         k: (new_value if k == field_name else v["value"]) for k, v in fields.items()
     }
-
-    anki_request("updateNoteFields", {"note": {"id": note_id, "fields": updated_fields}})
-
-# --- Replace tag (newTag) robust version ---
-def replace_note_tag(note_id: int, new_tag: str):
-    note_info = anki_request("notesInfo", {"notes": [note_id]})
+    # Keep the prefetched copy in sync so a later update to the same note
+    # does not write the old value of this field back.
+    fields[field_name]["value"] = new_value
+
+    return {"action": "updateNoteFields", "params": {"note": {"id": note_id, "fields": updated_fields}}}
+
+def build_note_update(note_id: int, new_values: Dict[str, str], note_info: Optional[dict], tags: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    One write for several fields of a note (and, with `tags`, its full tag list), as produced by
+    the combined "all" generation mode. Uses updateNote when tags change, updateNoteFields otherwise.
+    """
+    for field_name, new_value in new_values.items():
+        # Validates the field and updates the prefetched copy, which then holds every new value
+        build_field_update(note_id, field_name, new_value, note_info)
+    note: Dict[str, Any] = {"id": note_id, "fields": {k: v["value"] for k, v in note_info.get("fields", {}).items()}}
+    if tags is None:
+        return {"action": "updateNoteFields", "params": {"note": note}}
+    note["tags"] = tags
+    return {"action": "updateNote", "params": {"note": note}}
+
+def resolve_tag_to_replace(note_id: int, new_tag: str, note_info: Optional[dict]) -> str:
+    """Validate `new_tag` for a note and return the existing tag it should replace."""
     if not note_info:
         raise Exception(f"Note {note_id} not found in Anki.")
 
-    current_tags: List[str] = note_info[0].get("tags", [])
+    current_tags: List[str] = note_info.get("tags", [])
     new_subject = new_tag.split("::")[0]
 
     if new_subject not in ALLOWED_SUBJECTS:
@@ -80,23 +109,158 @@ def replace_note_tag(note_id: int, new_tag: str):
     if not tag_to_replace:
         raise Exception(f"No existing tag with base subject '{new_subject}' found in note {note_id}. Current tags: {current_tags}")
 
-    # Call AnkiConnect replaceTags
-    anki_request(
-        "replaceTags",
-        {
-            "notes": [note_id],
+    # Keep the prefetched copy in sync for any later update to the same note
+    note_info["tags"] = [new_tag if tag == tag_to_replace else tag for tag in current_tags]
+    return tag_to_replace
+
+def build_tag_replacement(note_ids: List[int], tag_to_replace: str, new_tag: str) -> Dict[str, Any]:
+    return {
+        "action": "replaceTags",
+        "params": {
+            "notes": note_ids,
             "tag_to_replace": tag_to_replace,
             "replace_with_tag": new_tag,
         },
-    )
+    }
+
+# --- Update field (Answer / Solution) ---
+def update_note_field(note_id: int, field_name: str, new_value: str, note_info: Optional[dict] = None):
+    if note_info is None:
+        note_info = fetch_notes_info_map([note_id]).get(note_id)
+    op = build_field_update(note_id, field_name, new_value, note_info)
+    anki_request(op["action"], op["params"])
+
+# --- Replace tag (newTag) robust version ---
+def replace_note_tag(note_id: int, new_tag: str, note_info: Optional[dict] = None):
+    if note_info is None:
+        note_info = fetch_notes_info_map([note_id]).get(note_id)
+    tag_to_replace = resolve_tag_to_replace(note_id, new_tag, note_info)
+    op = build_tag_replacement([note_id], tag_to_replace, new_tag)
+    anki_request(op["action"], op["params"])
+
+# --- Batched apply via AnkiConnect 'multi' ---
+def apply_batch(batch: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    Send prepared operations in a single round trip.
+    Returns one error message (or None on success) per operation, in order.
+    """
+    if len(batch) == 1:
+        try:
+            anki_request(batch[0]["action"], batch[0]["params"])
+            return [None]
+        except Exception as e:
+            return [str(e)]
+
+    try:
+        results = anki_multi([{"action": op["action"], "params": op["params"]} for op in batch])
+    except Exception as e:
+        # The whole request failed, so none of the items were applied
+        return [str(e)] * len(batch)
+    return [str(error) if error else None for _, error in results]
+
+# --- Concurrent executor ---
+class UpdateExecutor:
+    """
+    Applies batches on a thread pool with at most `max_in_flight` requests outstanding.
+    When the limit is reached, submit() blocks on the oldest request (back-pressure).
+    Results are handed to `on_result` in submission order, so log lines stay ordered.
+    """
+
+    def __init__(self, max_in_flight: int, on_result: Callable[[List[Dict[str, Any]], List[Optional[str]]], None]):
+        self.max_in_flight = max(1, max_in_flight)
+        self.on_result = on_result
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight) if self.max_in_flight > 1 else None
+        self._in_flight: Deque[Tuple[List[Dict[str, Any]], Future]] = deque()
+
+    def submit(self, batch: List[Dict[str, Any]]):
+        if self._pool is None:
+            self.on_result(batch, apply_batch(batch))
+            return
+        while len(self._in_flight) >= self.max_in_flight:
+            self._complete_oldest()
+        self._in_flight.append((batch, self._pool.submit(apply_batch, batch)))
+
+    def _complete_oldest(self):
+        batch, future = self._in_flight.popleft()
+        self.on_result(batch, future.result())
+
+    def close(self):
+        """Wait for every outstanding request and report it."""
+        while self._in_flight:
+            self._complete_oldest()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+class AsyncUpdateExecutor:
+    """
+    Same contract as UpdateExecutor, but requests are pipelined on the asyncio client
+    (one event loop, one connection pool) instead of a thread pool.
+    """
+
+    def __init__(self, max_in_flight: int, on_result: Callable[[List[Dict[str, Any]], List[Optional[str]]], None]):
+        self.max_in_flight = max(1, max_in_flight)
+        self.on_result = on_result
+        self._runner = anki_async.AsyncRunner(pool_size=max(anki_client.POOL_SIZE, self.max_in_flight))
+        self._in_flight: Deque[Tuple[List[Dict[str, Any]], Any]] = deque()
+
+    def submit(self, batch: List[Dict[str, Any]]):
+        while len(self._in_flight) >= self.max_in_flight:
+            self._complete_oldest()
+        self._in_flight.append((batch, self._runner.submit(anki_async.apply_batch(self._runner.client, batch))))
+
+    def _complete_oldest(self):
+        batch, task = self._in_flight.popleft()
+        self.on_result(batch, self._runner.wait(task))
+
+    def close(self):
+        while self._in_flight:
+            self._complete_oldest()
+        self._runner.close()
+
+# --- Ordered progress log ---
+class OrderedLog:
+    """
+    Holds each note's [counter] log lines until the note has its outcome and every earlier
+    note has been printed. Validation failures (known at once), batched writes (known when the
+    batch returns) and shared replaceTags calls (sent last) therefore still print in order.
+    """
+
+    def __init__(self):
+        self._next = 1
+        self._lines: Dict[int, List[Tuple[Callable[[str], None], str]]] = {}
+        self._finished: set = set()
+
+    def add(self, counter: int, log: Callable[[str], None], message: str):
+        self._lines.setdefault(counter, []).append((log, message))
+
+    def finish(self, counter: int):
+        self._finished.add(counter)
+        while self._next in self._finished:
+            self._finished.discard(self._next)
+            for log, message in self._lines.pop(self._next, []):
+                log(message)
+            self._next += 1
+
+    def close(self):
+        """Print whatever is left (notes that never got an outcome), still in order."""
+        for counter in sorted(self._lines):
+            for log, message in self._lines.pop(counter):
+                log(message)
 
 # --- Main update function ---
-def run_update_notes():
+def run_update_notes(
+    batch_size: int = BATCH_SIZE,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    use_mirror: bool = False,
+    use_async: bool = False,
+):
     # 0. Conditional Run merge_json.py to prepare update data
     
     # Check if the final files are already present. If both exist, assume
     # the merge has already happened or is unnecessary, and skip the merge script.
-    if TARGET_IDS_FILE.exists() and UPDATE_DATA_FILE.exists():
+    # A single-part `fetch_notes --format jsonl` run leaves input.jsonl instead of input.json.
+    target_ids_file = TARGET_IDS_FILE if TARGET_IDS_FILE.exists() else TARGET_IDS_FILE.with_suffix(".jsonl")
+    if target_ids_file.exists() and UPDATE_DATA_FILE.exists():
         log_warn(f"Final files {TARGET_IDS_FILE.name} and {UPDATE_DATA_FILE.name} already exist.")
         log_info("Skipping execution of merge script (src/merge_json.py).")
     else:
@@ -133,13 +297,14 @@ def run_update_notes():
             raise typer.Exit(code=1)
     
     # 1. Load target note IDs (Must exist now, either pre-existing or created by the script)
-    if not TARGET_IDS_FILE.exists():
+    target_ids_file = TARGET_IDS_FILE if TARGET_IDS_FILE.exists() else TARGET_IDS_FILE.with_suffix(".jsonl")
+    if not target_ids_file.exists():
         log_error(f"Target IDs file not found: {TARGET_IDS_FILE}. Merge script likely failed to create it.")
         raise typer.Exit(code=1)
 
-    log_task(f"Loading target note IDs from {TARGET_IDS_FILE}...")
-    with open(TARGET_IDS_FILE, "r", encoding="utf-8") as f:
-        target_data: List[Dict[str, Any]] = json.load(f)
+    log_task(f"Loading target note IDs from {target_ids_file}...")
+    with metrics.span("file.read_json", "io", path=str(target_ids_file)):
+        target_data: List[Dict[str, Any]] = read_part(target_ids_file)
 
     if not isinstance(target_data, list):
         log_error("input.json must contain an array of objects.")
@@ -154,8 +319,9 @@ def run_update_notes():
         raise typer.Exit(code=1)
 
     log_task(f"Loading updates from {UPDATE_DATA_FILE}...")
-    with open(UPDATE_DATA_FILE, "r", encoding="utf-8") as f:
-        updates: List[Dict[str, Any]] = json.load(f)
+    with metrics.span("file.read_json", "io", path=str(UPDATE_DATA_FILE)):
+        with open(UPDATE_DATA_FILE, "r", encoding="utf-8") as f:
+            updates: List[Dict[str, Any]] = json.load(f)
 
     if not isinstance(updates, list):
         log_error("output.json must contain an array of objects.")
@@ -163,9 +329,74 @@ def run_update_notes():
 
     log_info(f"Loaded {len(updates)} updates.")
 
-    # 3. Process updates
-    success, fail, skipped = 0, 0, 0
+    # 3. Prefetch current note data for every note we are going to touch
+    prefetch_ids = sorted({
+        entry.get("noteId") for entry in updates
+        if isinstance(entry.get("noteId"), int) and entry.get("noteId") in target_note_ids
+    })
+    if use_mirror:
+        # Only notes whose mod time moved since the last mirror refresh are re-downloaded
+        log_task(f"Refreshing {len(prefetch_ids)} note(s) in mirror {note_mirror.MIRROR_PATH}...")
+        mirror = note_mirror.connect()
+        fetched = note_mirror.refresh_notes(mirror, prefetch_ids)
+        log_info(f"{fetched} note(s) re-fetched from Anki, {len(prefetch_ids) - fetched} served from mirror.")
+        notes_by_id = note_mirror.notes_info_map(mirror, prefetch_ids)
+        mirror.close()
+    else:
+        log_task(f"Prefetching note info for {len(prefetch_ids)} note(s) in batches of {NOTES_INFO_BATCH_SIZE}...")
+        if use_async:
+            notes_by_id = anki_async.fetch_notes_info_map_sync(prefetch_ids, concurrency=max(1, max_in_flight))
+        else:
+            notes_by_id = fetch_notes_info_map(prefetch_ids)
+    log_info(f"Prefetched {len(notes_by_id)} note(s).")
+
+    # 4. Process updates
+    success, fail, skipped, unchanged = 0, 0, 0, 0
     counter = 0  # Numbering tracker
+    batch_size = max(1, batch_size)
+    # Prepared operations waiting to be sent. Each carries the (counter, noteId)
+    # pairs it covers so results can be reported per note.
+    pending: List[Dict[str, Any]] = []
+    # Notes moving between the same two tags share one replaceTags call
+    tag_groups: Dict[tuple, List[tuple]] = {}
+    # Every per-note line goes through here, so lines are printed in [counter] order
+    progress = OrderedLog()
+
+    def report_batch(batch: List[Dict[str, Any]], errors: List[Optional[str]]):
+        nonlocal success, fail
+        for op, error in zip(batch, errors):
+            for op_counter, op_note_id in op["members"]:
+                if error:
+                    progress.add(op_counter, log_error, f"[{op_counter}] Failed to update note {op_note_id}: {error}")
+                    fail += 1
+                else:
+                    progress.add(op_counter, log_success, f"[{op_counter}] Note {op_note_id}: {op['label']} updated")
+                    success += 1
+                progress.finish(op_counter)
+
+    max_in_flight = max(1, max_in_flight)
+    if use_async:
+        executor = AsyncUpdateExecutor(max_in_flight, report_batch)
+    else:
+        if max_in_flight > anki_client.POOL_SIZE:
+            # Give every in-flight request its own keep-alive connection
+            anki_client.configure(pool_size=max_in_flight)
+        executor = UpdateExecutor(max_in_flight, report_batch)
+    if max_in_flight > 1:
+        log_info(f"Applying updates with up to {max_in_flight} request(s) in flight{' (asyncio)' if use_async else ''}.")
+
+    def flush_pending():
+        if not pending:
+            return
+        if len(pending) > 1:
+            log_task(f"Sending batch of {len(pending)} update(s)...")
+        executor.submit(list(pending))
+        pending.clear()
+
+    def queue(op: Dict[str, Any]):
+        pending.append(op)
+        if len(pending) >= batch_size:
+            flush_pending()
 
     for entry in updates:
         note_id = entry.get("noteId")
@@ -180,32 +411,74 @@ def run_update_notes():
             continue
 
         counter += 1  # Increment per valid processed note
+        note_info = notes_by_id.get(note_id)
+
+        # Output of the combined "all" mode carries several of these per note
+        new_values = {name: str(entry[name]) for name in UPDATE_FIELDS if name in entry}
+        new_tag = entry.get("newTag")
+        if not new_values and new_tag is None:
+            progress.add(counter, log_warn, f"[{counter}] Note {note_id}: No recognized update field, skipped.")
+            progress.finish(counter)
+            skipped += 1
+            continue
+
+        # Drop writes that would leave the note exactly as it is
+        for field_name in [name for name, value in new_values.items() if field_unchanged(note_info, name, value)]:
+            progress.add(counter, log_info, f"[{counter}] Note {note_id}: {field_name} unchanged, skipped")
+            del new_values[field_name]
 
         try:
-            if "Answer" in entry:
-                log_task(f"[{counter}] Note {note_id}: Updating Answer...")
-                update_note_field(note_id, "Answer", str(entry["Answer"]))
-                log_success(f"[{counter}] Note {note_id}: Answer updated")
-                success += 1
-            elif "Solution" in entry:
-                log_task(f"[{counter}] Note {note_id}: Updating Solution...")
-                update_note_field(note_id, "Solution", str(entry["Solution"]))
-                log_success(f"[{counter}] Note {note_id}: Solution updated")
-                success += 1
-            elif "newTag" in entry:
-                log_task(f"[{counter}] Note {note_id}: Updating Tags with newTag '{entry['newTag']}'...")
-                replace_note_tag(note_id, entry["newTag"])
-                log_success(f"[{counter}] Note {note_id}: Tags updated")
-                success += 1
+            if new_tag is not None:
+                progress.add(counter, log_task, f"[{counter}] Note {note_id}: Updating Tags with newTag '{new_tag}'...")
+                try:
+                    tag_to_replace = resolve_tag_to_replace(note_id, new_tag, note_info)
+                except Exception as e:
+                    if not new_values:
+                        raise
+                    # Still apply the field updates that came with the bad tag
+                    progress.add(counter, log_warn, f"[{counter}] Note {note_id}: Tags not updated: {e}")
+                    new_tag = None
+                else:
+                    if tag_to_replace == new_tag:
+                        progress.add(counter, log_info, f"[{counter}] Note {note_id}: Tags unchanged, skipped")
+                        new_tag = None
+                    elif not new_values:
+                        # Reported when the shared replaceTags call returns
+                        tag_groups.setdefault((tag_to_replace, new_tag), []).append((counter, note_id))
+                        continue
+
+            if not new_values and new_tag is None:
+                progress.finish(counter)
+                unchanged += 1
+                continue
+            label = " + ".join(list(new_values) + (["Tags"] if new_tag is not None else []))
+            progress.add(counter, log_task, f"[{counter}] Note {note_id}: Updating {label}...")
+            if new_tag is None and len(new_values) == 1:
+                field_name, new_value = next(iter(new_values.items()))
+                op = build_field_update(note_id, field_name, new_value, note_info)
             else:
-                log_warn(f"[{counter}] Note {note_id}: No recognized update field, skipped.")
-                skipped += 1
+                # One write for all of the note's changes instead of one per field and a replaceTags
+                op = build_note_update(note_id, new_values, note_info, note_info["tags"] if new_tag is not None else None)
+            queue({**op, "members": [(counter, note_id)], "label": label})
         except Exception as e:
-            log_error(f"[{counter}] Failed to update note {note_id}: {e}")
+            progress.add(counter, log_error, f"[{counter}] Failed to update note {note_id}: {e}")
+            progress.finish(counter)
             fail += 1
 
+    if tag_groups:
+        log_task(f"Replacing tags: {sum(len(m) for m in tag_groups.values())} note(s) in {len(tag_groups)} replaceTags call(s)...")
+    for (tag_to_replace, new_tag), members in tag_groups.items():
+        op = build_tag_replacement([nid for _, nid in members], tag_to_replace, new_tag)
+        queue({**op, "members": members, "label": "Tags"})
+
+    flush_pending()
+    executor.close()
+    progress.close()
+
     log_info("-" * 40)
-    log_info(f"Update complete → Success: {success}, Failed: {fail}, Skipped: {skipped}")
+    log_info(f"Update complete → Success: {success}, Failed: {fail}, Skipped: {skipped}, Unchanged: {unchanged}")
+    for line in format_action_stats():
+        log_info(f"AnkiConnect {line}")
 
 # --- Typer CLI ---
 app = typer.Typer(
@@ -214,12 +487,50 @@ app = typer.Typer(
 )
 
 @app.command()
-def main():
+def main(
+    batch_size: int = typer.Option(
+        BATCH_SIZE,
+        "--batch-size", "-b",
+        help=f"Number of updates sent per AnkiConnect 'multi' request (default: {BATCH_SIZE}; 1 disables batching)."
+    ),
+    workers: int = typer.Option(
+        MAX_IN_FLIGHT,
+        "--workers", "-w",
+        help=f"Maximum AnkiConnect requests in flight at once (default: {MAX_IN_FLIGHT}). Raise for large runs."
+    ),
+    mirror: bool = typer.Option(
+        False,
+        "--mirror",
+        help="Read current note data from the local SQLite mirror, re-fetching only notes that changed in Anki."
+    ),
+    use_async: bool = typer.Option(
+        False,
+        "--async",
+        help="Pipeline requests on the asyncio client (needs httpx); --workers sets how many are in flight."
+    ),
+    profile: Optional[Path] = typer.Option(
+        None,
+        "--profile",
+        help="Write a JSON metrics summary (timings, call and byte counts) to this path."
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        help="Also write a Chrome-trace file (open in chrome://tracing or Perfetto)."
+    )
+):
+    if profile or trace:
+        metrics.enable(trace=trace is not None)
     try:
-        run_update_notes()
+        run_update_notes(batch_size, workers, mirror, use_async)
     except Exception as e:
         log_error(f"Critical error: {e}")
         raise typer.Exit(code=1)
+    finally:
+        if profile or trace:
+            metrics.dump(profile, trace)
+            for line in metrics.format_summary():
+                log_info(f"Profile {line}")
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import json
+import random
+import time
+from typing import Callable, List, Tuple
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from json_extract import extract_objects
+from stream_parser import JsonArrayStreamParser
+
+# --- CONFIGURATION ---
+DEFAULT_SIZES_MB = "1,4,16"
+STREAM_CHUNK_CHARS = 1024  # Roughly what a streamed model response delivers per chunk
+
+console = Console()
+
+def log_info(message): console.print(f"[i] {message}", style="cyan")
+def log_task(message): console.print(f"[*] {message}", style="magenta")
+
+
+# --- Synthetic responses ---
+def make_response(size_mb: float, malformed_rate: float, seed: int) -> Tuple[str, int]:
+    """
+    A fenced, pretty-printed solution-mode response of about `size_mb` MB.
+    Solutions contain LaTeX/HTML braces, set notation with '}, {' and escaped quotes; a
+    share of the objects is broken with an unescaped quote, as models sometimes do.
+    Returns (text, valid object count).
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    pieces: List[str] = []
+    total, valid, note_id = 0, 0, 1700000000000
+    while total < target:
+        solution = (
+            "<h3>Explanation:</h3><ul><li>Using $\\frac{a}{b} = \\frac{%d}{%d}$ we get {x} = %d.</li>"
+            "<li>The \"key\" step: set {y | y > 0}.</li>"
+            "<li>Partition: {%d, %d}, {%d}, {%d, %d}.</li></ul>"
+            % tuple(rng.randint(1, 999) for _ in range(8))
+        ) * rng.randint(1, 6)
+        obj = json.dumps({"noteId": note_id, "Solution": solution}, ensure_ascii=False, indent=2)
+        if rng.random() < malformed_rate:
+            obj = obj.replace('\\"key\\"', '"key"', 1)  # Unescaped quotes inside the string
+        else:
+            valid += 1
+        pieces.append(obj)
+        total += len(obj) + 2
+        note_id += 1
+    return "```json\n[\n" + ",\n".join(pieces) + "\n]\n```", valid
+
+
+# --- Implementations under test ---
+def legacy_filter_valid_objects(raw_json_str: str) -> list:
+    """The previous brace-counting splitter from content_generator_gemini.py (string-unaware)."""
+    raw_json_str = raw_json_str.strip()
+    if raw_json_str.startswith("```json"):
+        raw_json_str = raw_json_str[len("```json"):].rstrip("`").strip()
+    if not raw_json_str.startswith("[") or not raw_json_str.endswith("]"):
+        return []
+    inner = raw_json_str[1:-1].strip()
+    objects, valid_objects = [], []
+    brace_count, start_idx = 0, 0
+    for i, char in enumerate(inner):
+        if char == '{':
+            if brace_count == 0:
+                start_idx = i
+            brace_count += 1
+        elif char == '}':
+            brace_count -= 1
+            if brace_count == 0:
+                obj_str = inner[start_idx:i + 1].strip()
+                if obj_str.startswith(','):
+                    obj_str = obj_str[1:].lstrip()
+                objects.append(obj_str)
+    for obj_str in objects:
+        try:
+            valid_objects.append(json.loads(obj_str))
+        except json.JSONDecodeError:
+            continue
+    return valid_objects
+
+
+def tolerant_extract(text: str) -> list:
+    return extract_objects(text)[0]
+
+
+def stream_extract(text: str) -> list:
+    parser = JsonArrayStreamParser()
+    objects = []
+    for i in range(0, len(text), STREAM_CHUNK_CHARS):
+        objects.extend(parser.feed(text[i:i + STREAM_CHUNK_CHARS]))
+    return objects
+
+
+IMPLEMENTATIONS: List[Tuple[str, Callable[[str], list]]] = [
+    ("legacy brace counting", legacy_filter_valid_objects),
+    ("tolerant extractor", tolerant_extract),
+    ("stream parser (1 KB chunks)", stream_extract),
+]
+
+
+def time_best(func: Callable[[str], list], text: str, repeats: int) -> Tuple[float, list]:
+    best, result = float("inf"), []
+    for _ in range(max(1, repeats)):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# --- CLI ---
+app = typer.Typer(
+    help="Micro-benchmark of the model-response JSON extractors on multi-megabyte synthetic responses.",
+    add_completion=False,
+)
+
+@app.command()
+def main(
+    sizes: str = typer.Option(DEFAULT_SIZES_MB, "--sizes", "-s", help="Comma-separated response sizes in MB."),
+    malformed: float = typer.Option(0.02, "--malformed", help="Share of objects broken with an unescaped quote."),
+    repeats: int = typer.Option(3, "--repeats", "-r", help="Runs per implementation; the best time is reported."),
+    seed: int = typer.Option(0, "--seed", help="Random seed for the synthetic responses."),
+):
+    table = Table(title="Response extractor benchmark", header_style="bold cyan")
+    for column in ("Size (MB)", "Implementation", "Best (s)", "MB/s", "Objects kept", "Valid objects", "Correct"):
+        table.add_column(column, justify="right")
+
+    for size in [float(s) for s in sizes.split(",") if s.strip()]:
+        log_task(f"Building a {size:g} MB response...")
+        text, valid = make_response(size, malformed, seed)
+        megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+        for i, (name, func) in enumerate(IMPLEMENTATIONS):
+            elapsed, objects = time_best(func, text, repeats)
+            table.add_row(f"{megabytes:.1f}" if i == 0 else "", name, f"{elapsed:.3f}",
+                          f"{megabytes / elapsed:.1f}" if elapsed else "-", str(len(objects)), str(valid),
+                          "[green]yes[/green]" if len(objects) == valid else "[red]no[/red]")
+        table.add_section()
+    console.print(table)
+    log_info("'Objects kept' above 'Valid objects' means broken objects were let through; below means valid ones were lost.")
+
+if __name__ == "__main__":
+    app()
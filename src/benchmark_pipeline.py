@@ -0,0 +1,199 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+import anki_client
+from fake_anki_server import make_synthetic_notes, start_fake_server, DEFAULT_DECK
+from part_files import read_part
+
+# --- CONFIGURATION ---
+DEFAULT_SIZES = "1000,10000,100000"
+RESULTS_FILE = Path("./data/bench/results.json")  # Every run is appended here for comparison
+
+console = Console()
+
+def log_info(message): console.print(f"[i] {message}", style="cyan")
+def log_task(message): console.print(f"[*] {message}", style="magenta")
+def log_success(message): console.print(f"[+] {message}", style="bold green")
+
+
+# --- Measurements ---
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process since it started, in MB (None where unsupported).
+    ru_maxrss never goes down and includes the in-process fake server, so a stage's value is
+    the peak up to the end of that stage, not that stage's own peak.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def file_snapshot(path: Path) -> Dict[Path, tuple]:
+    snapshot = {}
+    for p in path.rglob("*"):
+        if p.is_file():
+            stat = p.stat()
+            snapshot[p] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def bytes_written_since(path: Path, before: Dict[Path, tuple]) -> int:
+    """Size of every file under `path` that was created or rewritten since `before` was taken."""
+    return sum(size for p, (mtime, size) in file_snapshot(path).items() if before.get(p, (None, None))[0] != mtime)
+
+
+class StageTimer:
+    """Collects wall time, AnkiConnect request counts, cumulative peak RSS and bytes written per stage."""
+
+    def __init__(self, server, workspace: Path):
+        self.server = server
+        self.workspace = workspace
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        calls_before = dict(self.server.call_counts)
+        http_before = self.server.http_requests
+        files_before = file_snapshot(self.workspace)
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        calls_after = dict(self.server.call_counts)
+        requests_by_action = {
+            action: count - calls_before.get(action, 0)
+            for action, count in calls_after.items()
+            if count - calls_before.get(action, 0)
+        }
+        self.stages[name] = {
+            "wall_s": round(elapsed, 4),
+            # Sub-actions of 'multi' are counted too; 'http_requests' is what went over the wire
+            "requests": requests_by_action,
+            "http_requests": self.server.http_requests - http_before,
+            "cumulative_peak_rss_mb": peak_rss_mb(),
+            "bytes_written": bytes_written_since(self.workspace, files_before),
+        }
+        log_info(f"  {name}: {elapsed:.2f}s, {self.stages[name]['http_requests']} HTTP request(s)")
+
+
+# --- Stages ---
+def fake_generate(input_dir: Path, output_dir: Path, seed: int = 0):
+    """Stand-in for the model step: write one Answer per input note to the matching output part."""
+    rng = random.Random(seed)
+    for input_file in sorted(input_dir.glob("input*.json*")):
+        notes = read_part(input_file)
+        results = [{"noteId": n["noteId"], "Answer": str(rng.randint(1, 4))} for n in notes]
+        output_file = output_dir / input_file.with_suffix(".json").name.replace("input", "output", 1)
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def run_size(size: int, batch_size: int, workers: int, latency: float, seed: int) -> Dict[str, Any]:
+    """Run fetch -> generate -> merge -> update for one synthetic deck size in a scratch workspace."""
+    original_cwd = Path.cwd()
+    with tempfile.TemporaryDirectory(prefix="anki-bench-") as tmp:
+        workspace = Path(tmp)
+        (workspace / "data" / "input").mkdir(parents=True)
+        (workspace / "data" / "output").mkdir(parents=True)
+        os.chdir(workspace)
+        server, url = start_fake_server(make_synthetic_notes(size, seed), latency=latency)
+        try:
+            anki_client.configure(url=url, pool_size=max(anki_client.POOL_SIZE, workers))
+            # Imported here so their relative ./data paths resolve inside the workspace
+            import fetch_notes
+            import anki_updater
+            import merge_json
+            fetch_notes.console.quiet = True
+            anki_updater.console.quiet = True
+
+            timer = StageTimer(server, workspace / "data")
+            timer.run("fetch", fetch_notes.run_fetch_notes, DEFAULT_DECK)
+            timer.run("generate", fake_generate, workspace / "data" / "input", workspace / "data" / "output", seed)
+            timer.run("merge", merge_json.merge_all, workspace / "data" / "input", workspace / "data" / "output")
+            timer.run("update", anki_updater.run_update_notes, batch_size, workers)
+        finally:
+            server.shutdown()
+            server.server_close()
+            os.chdir(original_cwd)
+
+    total_wall = sum(stage["wall_s"] for stage in timer.stages.values())
+    return {"notes": size, "total_wall_s": round(total_wall, 4), "stages": timer.stages}
+
+
+def save_results(run: Dict[str, Any], results_file: Path):
+    history: List[Dict[str, Any]] = []
+    if results_file.exists():
+        try:
+            with open(results_file, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except json.JSONDecodeError:
+            history = []
+    history.append(run)
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    table = Table(title="Pipeline benchmark", header_style="bold cyan")
+    for column in ("Notes", "Stage", "Wall (s)", "HTTP requests", "Cumulative peak RSS (MB)", "Bytes written"):
+        table.add_column(column, justify="right")
+    for result in results:
+        for i, (stage, m) in enumerate(result["stages"].items()):
+            rss = f"{m['cumulative_peak_rss_mb']:.1f}" if m["cumulative_peak_rss_mb"] is not None else "-"
+            table.add_row(str(result["notes"]) if i == 0 else "", stage, f"{m['wall_s']:.2f}",
+                          str(m["http_requests"]), rss, str(m["bytes_written"]))
+        table.add_section()
+    console.print(table)
+
+
+# --- CLI ---
+app = typer.Typer(
+    help="Benchmarks the fetch -> generate -> merge -> update cycle against a local fake AnkiConnect.",
+    add_completion=False,
+)
+
+@app.command()
+def main(
+    sizes: str = typer.Option(DEFAULT_SIZES, "--sizes", "-s", help="Comma-separated synthetic deck sizes."),
+    batch_size: int = typer.Option(50, "--batch-size", "-b", help="anki_updater --batch-size for the update stage."),
+    workers: int = typer.Option(1, "--workers", "-w", help="anki_updater --workers for the update stage."),
+    latency_ms: float = typer.Option(0.0, "--latency", help="Fake AnkiConnect latency per request, in milliseconds."),
+    label: str = typer.Option("", "--label", help="Free-form label stored with the results (e.g. a branch name)."),
+    output: Path = typer.Option(RESULTS_FILE, "--output", "-o", help="Results file (runs are appended)."),
+    seed: int = typer.Option(0, "--seed", help="Random seed for the synthetic decks."),
+):
+    size_list = [int(s) for s in sizes.split(",") if s.strip()]
+    output = output.resolve()
+    results = []
+    for size in size_list:
+        log_task(f"Benchmarking {size} note(s)...")
+        results.append(run_size(size, batch_size, workers, latency_ms / 1000, seed))
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "label": label,
+        "settings": {"batch_size": batch_size, "workers": workers, "latency_ms": latency_ms, "seed": seed},
+        "results": results,
+    }
+    save_results(run, output)
+    print_summary(results)
+    log_success(f"Results appended to {output}")
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from analyze_tags import classify_tag_issues
+from payload_minimizer import minimize_text
+
+# --- CONFIGURATION ---
+# Generation modes of content_generator_gemini.py. Only the first three have a "nothing to do" rule;
+# the solution:* modes rewrite existing solutions, so every note stays a candidate. "all" does
+# tag + answer + solution in one request and keeps a note if any of the three has work.
+MODES = ("tag", "answer", "solution", "solution:meaning", "solution:spot-the-error", "all")
+COMBINED_MODES = ("tag", "answer", "solution")
+# Per-note flag in "all" mode part files: whether the model should write a Solution. Notes kept
+# only for tag or answer work must not have their existing (unsent) Solution overwritten.
+SOLUTION_FLAG = "NeedsSolution"
+VALID_ANSWERS = {"1", "2", "3", "4"}
+
+# Extra Anki search terms per mode. They only ever remove notes that certainly need no work
+# (a superset of the candidates stays), and needs_work() makes the exact decision afterwards.
+# The solution pattern keeps anything minimize_text() could reduce to nothing: whitespace of
+# any kind, HTML entities (&nbsp;, &#160;, ...) and tags.
+QUERY_FILTERS = {
+    "answer": '-"Answer:re:^[1-4]$"',
+    "solution": '("Solution:" OR "Solution:re:^([[:space:]]|&[^;]+;|<[^>]*>)*$")',
+}
+
+
+def field_value(note: dict, name: str) -> str:
+    return note.get("fields", {}).get(name, {}).get("value", "")
+
+
+def needs_work(note: dict, mode: Optional[str]) -> bool:
+    """Whether a notesInfo-shaped note still needs the model in `mode` (None keeps every note)."""
+    if mode == "tag":
+        # Same rules as analyze_tags.py: exactly one well-formed Subject::Topic tag means done
+        return bool(classify_tag_issues(note.get("tags", [])))
+    if mode == "answer":
+        return minimize_text(field_value(note, "Answer")) not in VALID_ANSWERS
+    if mode == "solution":
+        return not minimize_text(field_value(note, "Solution"))
+    if mode == "all":
+        return any(needs_work(note, part) for part in COMBINED_MODES)
+    return True
+
+
+def needs_solution(note: dict) -> bool:
+    """For a part-file note in "all" mode; notes without the flag (older parts) get a Solution."""
+    return note.get(SOLUTION_FLAG, True) is not False
+
+
+def search_query(deck: str, mode: Optional[str] = None) -> str:
+    """findNotes query for the deck, narrowed by the mode's search filter where Anki can express it."""
+    query = f'deck:"{deck}"'
+    extra = QUERY_FILTERS.get(mode or "")
+    return f"{query} {extra}" if extra else query
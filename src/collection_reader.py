@@ -0,0 +1,120 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# --- CONFIGURATION ---
+CONFIG_FILE = Path(__file__).parent.parent / "configs" / "config.json"  # Holds "anki_path" (also used by bank.py)
+FIELD_SEPARATOR = "\x1f"  # Anki joins note fields (and nested deck names) with 0x1f
+SQL_VARIABLE_CHUNK = 900  # Stay under SQLite's host-parameter limit for IN (...) queries
+
+
+def default_collection_path() -> Optional[Path]:
+    """Collection path from configs/config.json ("anki_path"), if configured."""
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            anki_path = json.load(f).get("anki_path")
+        return Path(anki_path) if anki_path else None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _unicase(a: str, b: str) -> int:
+    # Anki declares some name columns with its own 'unicase' collation
+    a, b = a.casefold(), b.casefold()
+    return (a > b) - (a < b)
+
+
+class CollectionReader:
+    """
+    Read-only access to notes in a collection.anki2 file, without AnkiConnect.
+    The file is opened as an immutable read-only URI, so a running Anki is never locked or modified.
+    Notes are returned in the same shape as AnkiConnect's notesInfo.
+    """
+
+    def __init__(self, collection_path: Path):
+        self.path = Path(collection_path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"Anki collection not found at {self.path}")
+        uri = f"{self.path.resolve().as_uri()}?mode=ro&immutable=1"
+        self.conn = sqlite3.connect(uri, uri=True)
+        self.conn.create_collation("unicase", _unicase)
+        self._models = self._load_models()
+
+    def close(self):
+        self.conn.close()
+
+    def _has_table(self, name: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+        return row is not None
+
+    # --- Schema lookups (new schema tables, falling back to the legacy col JSON) ---
+    def _load_models(self) -> Dict[int, Tuple[str, List[str]]]:
+        """{notetype id: (notetype name, [field names in ord order])}"""
+        models: Dict[int, Tuple[str, List[str]]] = {}
+        if self._has_table("notetypes") and self._has_table("fields"):
+            names = {ntid: name for ntid, name in self.conn.execute("SELECT id, name FROM notetypes")}
+            fields: Dict[int, List[Tuple[int, str]]] = {}
+            for ntid, ord_, name in self.conn.execute("SELECT ntid, ord, name FROM fields"):
+                fields.setdefault(ntid, []).append((ord_, name))
+            for ntid, name in names.items():
+                models[ntid] = (name, [fname for _, fname in sorted(fields.get(ntid, []))])
+        else:
+            (models_json,) = self.conn.execute("SELECT models FROM col").fetchone()
+            for mid, model in json.loads(models_json).items():
+                flds = sorted(model.get("flds", []), key=lambda f: f.get("ord", 0))
+                models[int(mid)] = (model.get("name", ""), [f["name"] for f in flds])
+        return models
+
+    def _deck_names(self) -> Dict[int, str]:
+        if self._has_table("decks"):
+            return {
+                did: name.replace(FIELD_SEPARATOR, "::")
+                for did, name in self.conn.execute("SELECT id, name FROM decks")
+            }
+        (decks_json,) = self.conn.execute("SELECT decks FROM col").fetchone()
+        return {int(did): deck["name"] for did, deck in json.loads(decks_json).items()}
+
+    def deck_ids(self, deck: str) -> List[int]:
+        """IDs of `deck` and its subdecks (matching Anki's deck:"X" search, case-insensitive)."""
+        wanted = deck.casefold()
+        return [
+            did for did, name in self._deck_names().items()
+            if name.casefold() == wanted or name.casefold().startswith(wanted + "::")
+        ]
+
+    # --- Notes ---
+    def find_note_ids(self, deck: str) -> List[int]:
+        """Equivalent of findNotes 'deck:"X"', including cards temporarily moved to filtered decks."""
+        dids = self.deck_ids(deck)
+        if not dids:
+            return []
+        marks = ",".join("?" * len(dids))
+        rows = self.conn.execute(
+            f"SELECT DISTINCT nid FROM cards WHERE did IN ({marks}) OR odid IN ({marks}) ORDER BY nid",
+            dids + dids,
+        )
+        return [nid for (nid,) in rows]
+
+    def _note_info(self, nid: int, mid: int, mod: int, tags: str, flds: str) -> dict:
+        model_name, field_names = self._models.get(mid, ("", []))
+        values = flds.split(FIELD_SEPARATOR)
+        fields = {}
+        for ord_, name in enumerate(field_names):
+            fields[name] = {"value": values[ord_] if ord_ < len(values) else "", "order": ord_}
+        return {"noteId": nid, "modelName": model_name, "mod": mod, "tags": tags.split(), "fields": fields}
+
+    def notes_info(self, note_ids: List[int]) -> List[dict]:
+        """notesInfo-shaped dicts for `note_ids`, in the given order (unknown IDs are skipped)."""
+        by_id: Dict[int, dict] = {}
+        for i in range(0, len(note_ids), SQL_VARIABLE_CHUNK):
+            chunk = note_ids[i:i + SQL_VARIABLE_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            for row in self.conn.execute(f"SELECT id, mid, mod, tags, flds FROM notes WHERE id IN ({marks})", chunk):
+                by_id[row[0]] = self._note_info(*row)
+        return [by_id[nid] for nid in note_ids if nid in by_id]
+
+    def iter_notes(self, note_ids: List[int], batch_size: int) -> Iterator[List[dict]]:
+        batch_size = max(1, batch_size)
+        for i in range(0, len(note_ids), batch_size):
+            yield self.notes_info(note_ids[i:i + batch_size])
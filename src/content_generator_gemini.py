@@ -255,8 +255,23 @@ import re
 import typer
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google import genai
 from google.genai.errors import APIError
+from pathlib import Path
+from typing import Optional
+
+import metrics
+from part_files import PartWriter, encode, loads_part
+from payload_minimizer import minimize_notes
+from token_budget import estimate_tokens
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache, cache_key
+from stream_parser import JsonArrayStreamParser
+from json_extract import extract_with_errors
+import reconcile
+import job_manifest
+from job_manifest import JobManifest
 
 # --- Paths ---
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -265,16 +280,29 @@ OUTPUT_DIR = os.path.join(PROJECT_ROOT, "data", "output")
 INSTRUCTIONS_DIR = os.path.join(PROJECT_ROOT, "instructions")
 LOG_DIR = os.path.join(PROJECT_ROOT, "log")
 RESPONSE_LOG_DIR = os.path.join(LOG_DIR, "response")
+RESPONSE_CACHE_PATH = os.path.join(PROJECT_ROOT, "data", "cache", "responses.sqlite3")
 
 # --- Gemini client ---
 client = genai.Client()
+MODEL_NAME = "gemini-3-flash-preview"
 
 # --- Typer app ---
-app = typer.Typer(help="Process JSON files with AI based on mode: tag, answer, solution, solution:meaning, or solution:spot-the-error.")
+app = typer.Typer(help="Process JSON files with AI based on mode: tag, answer, solution, solution:meaning, solution:spot-the-error, or all.")
+
+# --- Combined mode ---
+# "all" sends these instructions together (plus update_all_instruction.md, which sets the
+# combined output format), so each note is uploaded and answered once instead of three times
+COMBINED_INSTRUCTION_FILES = [
+    os.path.join(INSTRUCTIONS_DIR, "update_tag_instruction.md"),
+    os.path.join(INSTRUCTIONS_DIR, "update_answer_instruction.md"),
+    os.path.join(INSTRUCTIONS_DIR, "update_solution_instruction.md"),
+]
+TAG_MODES = {"tag", "all"}  # Modes that need tags.json in the prompt
 
 # --- Rate Limit Configuration ---
-RATE_LIMIT_RPM = 10
-DELAY_SECONDS = 60.0 / RATE_LIMIT_RPM  # 6 seconds per request
+RATE_LIMIT_RPM = 10         # Requests per rolling minute
+RATE_LIMIT_TPM = 250_000    # Input tokens per rolling minute (0 = unlimited)
+MAX_WORKERS = 4             # Part files processed concurrently; the limiter keeps them inside the quota
 
 # --- Exponential Backoff Configuration ---
 MAX_RETRIES = 3
@@ -282,9 +310,14 @@ INITIAL_BACKOFF_SECONDS = 2
 BACKOFF_JITTER = 1
 
 # --- Helpers ---
+def log_file(input_file: str, message: str):
+    # Several files are processed at once, so every line names its file
+    typer.echo(f"    - [{os.path.basename(input_file)}] {message}")
+
 def read_file_content(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read() or ""
+    with metrics.span("file.read", "io"):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read() or ""
 
 def remove_markdown_json_block(text: str | None) -> str:
     if text is None:
@@ -295,102 +328,287 @@ def remove_markdown_json_block(text: str | None) -> str:
         return match.group(1).strip()
     return text.strip()
 
-def build_prompt(mode: str, instruction_file: str, input_file: str, tags_file: str | None = None) -> str:
+def load_input_notes(input_file: str) -> tuple[list | None, str]:
+    """
+    Returns (notes, payload): the part's notes with Anki HTML stripped and empty fields dropped,
+    and their compact JSON. When the file is not a list of note objects, notes is None and
+    the payload is the raw text.
+    """
+    raw = read_file_content(input_file)
+    try:
+        notes = loads_part(raw, jsonl=input_file.endswith(".jsonl"))
+    except json.JSONDecodeError:
+        return None, raw
+    if not all(isinstance(note, dict) for note in notes):
+        return None, raw
+    minimized, _ = minimize_notes(notes)
+    payload = encode(minimized).decode("utf-8")
+    saved = estimate_tokens(raw) - estimate_tokens(payload)
+    metrics.count("tokens.saved_by_minimizer", max(0, saved))
+    if saved > 0:
+        log_file(input_file, f"Minimized input: ~{estimate_tokens(payload)} tokens (~{saved} saved)")
+    return minimized, payload
+
+def read_input_payload(input_file: str) -> str:
+    return load_input_notes(input_file)[1]
+
+def instruction_files(mode: str, instruction_file: str) -> list:
+    return COMBINED_INSTRUCTION_FILES + [instruction_file] if mode == "all" else [instruction_file]
+
+def build_prompt(
+    mode: str,
+    instruction_file: str,
+    input_file: str,
+    tags_file: str | None = None,
+    payload: str | None = None,
+) -> str:
     prompt_sections = []
-    prompt_sections.append(f"path:{os.path.basename(instruction_file)}\n<file_content>\n{read_file_content(instruction_file)}\n</file_content>")
-    if mode == "tag" and tags_file:
+    for path in instruction_files(mode, instruction_file):
+        prompt_sections.append(f"path:{os.path.basename(path)}\n<file_content>\n{read_file_content(path)}\n</file_content>")
+    if mode in TAG_MODES and tags_file:
         prompt_sections.append(f"path:{os.path.basename(tags_file)}\n<file_content>\n{read_file_content(tags_file)}\n</file_content>")
-    prompt_sections.append(f"path:{os.path.basename(input_file)}\n<file_content>\n{read_file_content(input_file)}\n</file_content>")
+    prompt_sections.append(f"path:{os.path.basename(input_file)}\n<file_content>\n{payload if payload is not None else read_input_payload(input_file)}\n</file_content>")
     return "\n\n".join(prompt_sections)
 
 # --- Helper: filter out malformed objects ---
-def filter_valid_objects(raw_json_str: str) -> list:
+def filter_valid_objects(raw_json_str: str, malformed: list | None = None) -> list:
     """
     Takes the AI JSON array as string.
-    Returns a list of valid objects, skipping those that are malformed JSON.
+    Returns a list of valid objects, skipping those that are malformed JSON
+    (their raw text is appended to `malformed` when given).
     """
-    raw_json_str = raw_json_str.strip()
-    if not raw_json_str.startswith("[") or not raw_json_str.endswith("]"):
-        return []
-
-    inner = raw_json_str[1:-1].strip()
-    objects = []
-    brace_count = 0
-    start_idx = 0
-    valid_objects = []
-
-    # Split objects safely using brace counting
-    for i, char in enumerate(inner):
-        if char == '{':
-            if brace_count == 0:
-                start_idx = i
-            brace_count += 1
-        elif char == '}':
-            brace_count -= 1
-            if brace_count == 0:
-                obj_str = inner[start_idx:i+1].strip()
-                if obj_str.startswith(','):
-                    obj_str = obj_str[1:].lstrip()
-                objects.append(obj_str)
-
-    # Validate each object
-    for idx, obj_str in enumerate(objects):
-        try:
-            obj = json.loads(obj_str)
-            valid_objects.append(obj)
-        except json.JSONDecodeError:
-            print(f"    - Skipping object at index {idx} due to malformed JSON")
-            continue
-
+    valid_objects, skipped = extract_with_errors(raw_json_str)
+    if skipped:
+        print(f"    - Skipped {len(skipped)} object(s) due to malformed JSON")
+        if malformed is not None:
+            malformed.extend(skipped)
     return valid_objects
 
-# --- Main processing ---
-def process_file(mode: str, instruction_file: str, input_file: str, output_file: str, tags_file: str | None = None):
-    prompt_text = build_prompt(mode, instruction_file, input_file, tags_file)
-    response = None
+# --- Output ---
+def write_output(input_file: str, output_file: str, objects: list):
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with metrics.span("file.write_output", "io"):
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(objects, f, indent=2, ensure_ascii=False)
+    metrics.count("file.bytes_written", os.path.getsize(output_file))
+    log_file(input_file, f"Successfully wrote {len(objects)} valid objects to {output_file}")
+
+def group_by_note(objects: list) -> dict:
+    """Model output objects keyed by str(noteId) (the model sometimes quotes the ID)."""
+    grouped: dict = {}
+    for obj in objects:
+        if isinstance(obj, dict) and "noteId" in obj:
+            grouped.setdefault(str(obj["noteId"]), []).append(obj)
+    return grouped
+
+def is_complete_array(text: str) -> bool:
+    try:
+        return isinstance(json.loads(text), list)
+    except json.JSONDecodeError:
+        return False
 
-    # --- Exponential backoff ---
+def stream_to_output(input_file: str, output_file: str, prompt_text: str, prefix_objects: list) -> tuple[str, tuple[list, list], object]:
+    """
+    Stream the model response and append each object to output_file as soon as it is complete.
+    `prefix_objects` (e.g. cached answers) are written first. If the stream breaks after some
+    objects arrived, those are kept.
+    Returns (raw text, (streamed objects, malformed object texts), usage metadata).
+    """
+    parser = JsonArrayStreamParser()
+    chunks: list = []
+    objects: list = []
+    usage = None
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with PartWriter(Path(output_file), "pretty") as writer:
+        for obj in prefix_objects:
+            writer.write(obj)
+        try:
+            with metrics.span("model.generate_content_stream", "model", file=os.path.basename(input_file)):
+                for chunk in client.models.generate_content_stream(model=MODEL_NAME, contents=prompt_text):
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    text = chunk.text or ""
+                    chunks.append(text)
+                    for obj in parser.feed(text):
+                        writer.write(obj)
+                        writer.flush()
+                        objects.append(obj)
+                        log_file(input_file, f"Received object {len(objects)} (noteId {obj.get('noteId')})")
+        except Exception as e:
+            if not objects:
+                raise
+            log_file(input_file, f"Stream broke after {len(objects)} object(s) ({e}). Keeping what arrived.")
+    if parser.malformed:
+        log_file(input_file, f"Skipped {parser.malformed} malformed object(s) in the stream")
+    return "".join(chunks), (objects, parser.malformed_texts), usage
+
+def call_model(
+    input_file: str,
+    prompt_text: str,
+    limiter: RateLimiter | None = None,
+    stream_output: str | None = None,
+    prefix_objects: list | None = None,
+) -> tuple[str | None, object, tuple[list, list] | None] | None:
+    """
+    One model request under the rate limiter, with exponential backoff on API errors.
+    With `stream_output` the response is streamed into that file (see stream_to_output).
+    Returns (raw text, usage metadata, streamed (objects, malformed) or None), or None if every attempt failed.
+    """
+    metrics.count("model.prompt_chars", len(prompt_text))
+    prompt_tokens = estimate_tokens(prompt_text)
     for attempt in range(MAX_RETRIES):
         try:
-            typer.echo(f"    - Attempt {attempt + 1}/{MAX_RETRIES}...")
-            response = client.models.generate_content(
-                model="gemini-3-flash-preview",
-                contents=prompt_text,
-            )
-            typer.echo("    - API call successful.")
-            break
+            if limiter is not None:
+                waited = limiter.acquire(prompt_tokens)
+                if waited > 0:
+                    log_file(input_file, f"Waited {waited:.1f}s for rate limit quota.")
+            log_file(input_file, f"Attempt {attempt + 1}/{MAX_RETRIES}...")
+            metrics.count("model.calls")
+            streamed = None
+            if stream_output:
+                ai_response, streamed, usage = stream_to_output(input_file, stream_output, prompt_text, prefix_objects or [])
+            else:
+                with metrics.span("model.generate_content", "model", file=os.path.basename(input_file)):
+                    response = client.models.generate_content(
+                        model=MODEL_NAME,
+                        contents=prompt_text,
+                    )
+                ai_response = response.text
+                usage = getattr(response, "usage_metadata", None)
+            log_file(input_file, "API call successful.")
         except APIError as e:
             if attempt < MAX_RETRIES - 1:
                 backoff_time = (INITIAL_BACKOFF_SECONDS * (2 ** attempt)) + random.uniform(0, BACKOFF_JITTER)
-                typer.echo(f"    - API Error ({e}). Retrying in {backoff_time:.2f}s...")
+                log_file(input_file, f"API Error ({e}). Retrying in {backoff_time:.2f}s...")
                 time.sleep(backoff_time)
-            else:
-                typer.echo(f"    - Final attempt failed with API Error ({e}). Skipping this file.")
-                response = None
-                break
+                continue
+            log_file(input_file, f"Final attempt failed with API Error ({e}). Skipping this file.")
+            return None
         except Exception as e:
-            typer.echo(f"    - Unexpected Error: {e}. Skipping this file.")
-            response = None
+            log_file(input_file, f"Unexpected Error: {e}. Skipping this file.")
+            return None
+
+        if limiter is not None and usage is not None and getattr(usage, "candidates_token_count", None):
+            # Output tokens count against the per-minute quota as well
+            limiter.record_tokens(usage.candidates_token_count)
+        metrics.count("model.response_chars", len(ai_response or ""))
+        return ai_response, usage, streamed
+    return None
+
+def reconcile_notes(
+    mode: str,
+    instruction_file: str,
+    input_file: str,
+    tags_file: str | None,
+    limiter: RateLimiter | None,
+    notes: list,
+    objects: list,
+    complete: bool,
+    malformed: list,
+) -> tuple[list, list]:
+    """
+    Compare the model output against the notes that were sent. Unusable objects are dropped,
+    and only the notes that are missing or came back broken are asked again, bisecting a
+    follow-up request that keeps failing. Returns (objects, notes still without an answer).
+    """
+    objects, invalid = reconcile.split_valid(objects, mode)
+    missing = reconcile.unanswered_notes(notes, objects, mode, complete, invalid | reconcile.note_ids_in(malformed))
+    if not missing:
+        return reconcile.drop_unrequested(objects, notes, mode), []
+    log_file(input_file, f"{len(missing)} of {len(notes)} note(s) missing or invalid in the response. Re-requesting only those.")
+
+    queue = reconcile.FollowUpQueue(missing)
+    while True:
+        group = queue.next()
+        if not group:
             break
+        metrics.count("reconcile.followup_calls")
+        metrics.count("reconcile.followup_notes", len(group))
+        prompt_text = build_prompt(mode, instruction_file, input_file, tags_file, encode(group).decode("utf-8"))
+        reply = call_model(input_file, prompt_text, limiter)
+        if reply is None or not reply[0]:
+            queue.report(group, group)
+            continue
+        clean_response = remove_markdown_json_block(reply[0])
+        bad: list = []
+        found, invalid = reconcile.split_valid(filter_valid_objects(clean_response, bad), mode)
+        wanted = {reconcile.note_key(note) for note in group}
+        found = [obj for obj in found if str(obj["noteId"]) in wanted]
+        objects.extend(found)
+        still = reconcile.unanswered_notes(group, found, mode, is_complete_array(clean_response), invalid | reconcile.note_ids_in(bad))
+        log_file(input_file, f"Follow-up for {len(group)} note(s): {len(group) - len(still)} resolved, {len(still)} still missing.")
+        queue.report(group, still)
+
+    if queue.given_up:
+        ids = ", ".join(reconcile.note_key(note) for note in queue.given_up)
+        log_file(input_file, f"Gave up on {len(queue.given_up)} note(s) without a valid answer: {ids}")
+    return reconcile.drop_unrequested(objects, notes, mode), queue.given_up
 
-    if response is None:
+# --- Main processing ---
+def process_file(
+    mode: str,
+    instruction_file: str,
+    input_file: str,
+    output_file: str,
+    tags_file: str | None = None,
+    limiter: RateLimiter | None = None,
+    cache: ResponseCache | None = None,
+    stream: bool = False,
+) -> tuple[str, int]:
+    """Returns (job status, number of objects in the output) for the run manifest."""
+    notes, payload = load_input_notes(input_file)
+    cached_objects: list = []
+    if cache is not None:
+        # Everything that determines the answer goes into the key
+        context = (
+            MODEL_NAME,
+            mode,
+            "\n".join(read_file_content(path) for path in instruction_files(mode, instruction_file)),
+            read_file_content(tags_file) if mode in TAG_MODES and tags_file else "",
+        )
+        file_key = cache_key(*context, payload)
+        hit = cache.get(file_key, "chunk")
+        if hit is not None:
+            log_file(input_file, "Response cache hit for the whole file, no model call needed.")
+            write_output(input_file, output_file, hit)
+            return job_manifest.DONE, len(hit)
+        if notes:
+            missing = []
+            for note in notes:
+                objects = cache.get(cache_key(*context, note), "note")
+                if objects is None:
+                    missing.append(note)
+                else:
+                    cached_objects.extend(objects)
+            if not missing:
+                log_file(input_file, f"All {len(notes)} note(s) answered from the response cache, no model call needed.")
+                cache.put(file_key, "chunk", cached_objects)
+                write_output(input_file, output_file, cached_objects)
+                return job_manifest.DONE, len(cached_objects)
+            if len(missing) < len(notes):
+                log_file(input_file, f"{len(notes) - len(missing)} note(s) answered from the response cache, {len(missing)} sent to the model.")
+                notes = missing
+                payload = encode(missing).decode("utf-8")
+
+    prompt_text = build_prompt(mode, instruction_file, input_file, tags_file, payload)
+    reply = call_model(input_file, prompt_text, limiter, output_file if stream else None, cached_objects)
+
+    if reply is None:
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump({"error": f"Failed after {MAX_RETRIES} attempts"}, f, indent=2, ensure_ascii=False)
-        return
-
-    ai_response = response.text
+        return job_manifest.FAILED, 0
+    ai_response, usage, streamed = reply
 
     if not ai_response:
-        typer.echo("    - AI returned no content. Skipping.")
+        log_file(input_file, "AI returned no content. Skipping.")
         try:
             os.makedirs(RESPONSE_LOG_DIR, exist_ok=True)
             log_file_path = os.path.join(RESPONSE_LOG_DIR, os.path.basename(output_file).replace(".json", ".log"))
             with open(log_file_path, "w", encoding="utf-8") as f:
                 f.write("[MODEL RETURNED NO TEXT CONTENT - SKIPPING JSON PROCESSING]")
         except Exception as e:
-            typer.echo(f"    - Failed to log no-content: {e}")
-        return
+            log_file(input_file, f"Failed to log no-content: {e}")
+        return job_manifest.FAILED, 0
 
     # --- Save raw AI response ---
     try:
@@ -398,31 +616,84 @@ def process_file(mode: str, instruction_file: str, input_file: str, output_file:
         log_file_path = os.path.join(RESPONSE_LOG_DIR, os.path.basename(output_file).replace(".json", ".log"))
         with open(log_file_path, "w", encoding="utf-8") as f:
             f.write(ai_response)
-        typer.echo(f"    - Raw AI response logged at {log_file_path}")
+        log_file(input_file, f"Raw AI response logged at {log_file_path}")
     except Exception as e:
-        typer.echo(f"    - Failed to log raw response: {e}")
+        log_file(input_file, f"Failed to log raw response: {e}")
 
     # --- Clean and filter valid objects ---
-    clean_response = remove_markdown_json_block(ai_response)
-    valid_objects = filter_valid_objects(clean_response)
+    with metrics.span("parse.model_response", "parse"):
+        clean_response = remove_markdown_json_block(ai_response)
+        if streamed is not None:
+            # Streamed objects were parsed (and written) as they arrived
+            valid_objects, malformed = streamed
+        else:
+            malformed = []
+            valid_objects = filter_valid_objects(clean_response, malformed)
+    complete = is_complete_array(clean_response)
+
+    # --- Reconcile against the notes that were sent ---
+    unresolved: list = []
+    if notes:
+        valid_objects, unresolved = reconcile_notes(
+            mode, instruction_file, input_file, tags_file, limiter, notes, list(valid_objects), complete, malformed
+        )
+        # Every note is accounted for, so the answer is as good as a well-formed one
+        complete = not unresolved
+
+    # Only a complete answer is cached for the chunk. Otherwise just the notes that did
+    # get an answer are cached, so they are not sent again.
+    if cache is not None:
+        if complete:
+            cache.put(cache_key(*context, payload), "chunk", valid_objects)
+        if notes:
+            # A note left out of a complete answer was deliberately skipped by the model
+            # (e.g. its answer was already right)
+            by_note = group_by_note(valid_objects)
+            pending = {reconcile.note_key(note) for note in unresolved}
+            for note in notes:
+                objects = by_note.get(reconcile.note_key(note))
+                if objects is not None or reconcile.note_key(note) not in pending:
+                    cache.put(cache_key(*context, note), "note", objects or [])
+    if cached_objects:
+        valid_objects = cached_objects + valid_objects
+        if complete:
+            cache.put(file_key, "chunk", valid_objects)
+
+    # A truncated answer is kept but marked partial, so a resumed run sends the rest again
+    status = job_manifest.DONE if complete else job_manifest.PARTIAL
 
     if not valid_objects:
-        typer.echo("    - No valid objects after filtering. Skipping output file.")
-        return
+        log_file(input_file, "No valid objects after filtering. Skipping output file.")
+        return (status if complete else job_manifest.FAILED), 0
+
+    if streamed is not None and valid_objects == cached_objects + streamed[0]:
+        metrics.count("file.bytes_written", os.path.getsize(output_file))
+        log_file(input_file, f"Streamed {len(valid_objects)} valid objects to {output_file}")
+        return status, len(valid_objects)
 
     # --- Write final JSON ---
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(valid_objects, f, indent=2, ensure_ascii=False)
-    typer.echo(f"    - Successfully wrote {len(valid_objects)} valid objects to {output_file}")
+    write_output(input_file, output_file, valid_objects)
+    return status, len(valid_objects)
 
 # --- CLI ---
 @app.command()
-def main(mode: str = typer.Option(..., "--mode", "-m", help="Mode: tag, answer, solution, solution:meaning, or solution:spot-the-error.")):
+def main(
+    mode: str = typer.Option(..., "--mode", "-m", help="Mode: tag, answer, solution, solution:meaning, solution:spot-the-error, or all (tag + answer + solution in one request)."),
+    workers: int = typer.Option(MAX_WORKERS, "--workers", "-w", help="Part files processed concurrently."),
+    rpm: int = typer.Option(RATE_LIMIT_RPM, "--rpm", help="Requests-per-minute quota."),
+    tpm: int = typer.Option(RATE_LIMIT_TPM, "--tpm", help="Tokens-per-minute quota (0 = unlimited)."),
+    use_cache: bool = typer.Option(True, "--cache/--no-cache", help="Reuse cached model output for unchanged files and notes."),
+    stream: bool = typer.Option(False, "--stream", help="Stream responses and write each object to the output file as it arrives."),
+    resume: bool = typer.Option(True, "--resume/--no-resume", help="Skip parts the run manifest records as done with a valid output."),
+    profile: Optional[Path] = typer.Option(None, "--profile", help="Write a JSON metrics summary (timings, call and byte counts) to this path."),
+    trace: Optional[Path] = typer.Option(None, "--trace", help="Also write a Chrome-trace file (open in chrome://tracing or Perfetto)."),
+):
     mode = mode.lower()
+    if profile or trace:
+        metrics.enable(trace=trace is not None)
     
     # Updated valid_modes list
-    valid_modes = {"tag", "answer", "solution", "solution:meaning", "solution:spot-the-error"}
+    valid_modes = {"tag", "answer", "solution", "solution:meaning", "solution:spot-the-error", "all"}
     if mode not in valid_modes:
         typer.echo(f"Invalid mode! Must be one of: {', '.join(valid_modes)}", err=True)
         raise typer.Exit(code=1)
@@ -434,6 +705,7 @@ def main(mode: str = typer.Option(..., "--mode", "-m", help="Mode: tag, answer,
         "solution": os.path.join(INSTRUCTIONS_DIR, "update_solution_instruction.md"),
         "solution:meaning": os.path.join(INSTRUCTIONS_DIR, "update_meaning_in_solution_instruction.md"),
         "solution:spot-the-error": os.path.join(INSTRUCTIONS_DIR, "update_solution_for_spot-the-error_instruction.md"),
+        "all": os.path.join(INSTRUCTIONS_DIR, "update_all_instruction.md"),
     }
     instruction_file = instruction_file_map[mode]
 
@@ -444,12 +716,13 @@ def main(mode: str = typer.Option(..., "--mode", "-m", help="Mode: tag, answer,
     else:
         processing_mode = mode
     
-    if not os.path.exists(instruction_file):
-        typer.echo(f"Instruction file not found: {instruction_file}", err=True)
-        raise typer.Exit(code=1)
+    for path in instruction_files(processing_mode, instruction_file):
+        if not os.path.exists(path):
+            typer.echo(f"Instruction file not found: {path}", err=True)
+            raise typer.Exit(code=1)
 
     tags_file = None
-    if processing_mode == "tag":
+    if processing_mode in TAG_MODES:
         tags_file = os.path.join(INSTRUCTIONS_DIR, "tags.json")
         if not os.path.exists(tags_file):
             typer.echo(f"Tags file not found: {tags_file}", err=True)
@@ -462,31 +735,85 @@ def main(mode: str = typer.Option(..., "--mode", "-m", help="Mode: tag, answer,
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     os.makedirs(RESPONSE_LOG_DIR, exist_ok=True)
 
-    json_files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".json")]
-
-    for i, filename in enumerate(json_files):
+    # fetch_notes writes .json parts by default and .jsonl parts with --format jsonl
+    json_files = [f for f in os.listdir(INPUT_DIR) if f.endswith((".json", ".jsonl"))]
+
+    limiter = RateLimiter(rpm, tpm)
+    cache = ResponseCache(Path(RESPONSE_CACHE_PATH)) if use_cache else None
+    run_key = cache_key(
+        MODEL_NAME,
+        mode,
+        "\n".join(read_file_content(path) for path in instruction_files(processing_mode, instruction_file)),
+        read_file_content(tags_file) if tags_file else "",
+    )
+    manifest = JobManifest(Path(OUTPUT_DIR) / job_manifest.MANIFEST_FILENAME, run_key, resume=resume)
+    manifest.retain(json_files)
+    jobs = []
+    finished = 0
+    for filename in json_files:
         input_file_path = os.path.join(INPUT_DIR, filename)
 
         # Output filename logic
-        if filename == "input.json":
+        stem, extension = os.path.splitext(filename)
+        if stem == "input":
             output_filename = "output.json"
-        elif filename.startswith("input-") and filename.endswith(".json"):
-            suffix = filename[len("input-"):-len(".json")]
+        elif stem.startswith("input-"):
+            suffix = stem[len("input-"):]
             output_filename = f"output-{suffix}.json"
         else:
-            output_filename = f"output-{filename}"
-
+            output_filename = f"output-{stem}.json" if extension == ".jsonl" else f"output-{filename}"
         output_file_path = os.path.join(OUTPUT_DIR, output_filename)
-        typer.echo(f"\n[{i+1}/{len(json_files)}] Processing {filename} -> {output_filename}")
-
-        # Pass the core processing_mode and the specific instruction_file path
-        process_file(processing_mode, instruction_file, input_file_path, output_file_path, tags_file)
 
-        if i < len(json_files) - 1:
-            typer.echo(f"  > Waiting {DELAY_SECONDS:.1f}s to respect {RATE_LIMIT_RPM} RPM rate limit...")
-            time.sleep(DELAY_SECONDS)
-
-    typer.echo("\nAll files processed successfully.")
+        input_hash = job_manifest.file_hash(input_file_path)
+        if manifest.is_finished(filename, input_hash):
+            finished += 1
+            continue
+        manifest.register(filename, input_hash, output_file_path)
+        jobs.append((filename, input_file_path, output_filename, output_file_path))
+
+    if finished:
+        typer.echo(f"Resuming: {finished} file(s) already done according to {manifest.path}, skipping them.")
+    typer.echo(f"Processing {len(jobs)} file(s) with {max(1, workers)} worker(s) within {rpm} RPM / {tpm or 'unlimited'} TPM...")
+    def run_job(filename, input_file_path, output_file_path):
+        manifest.start(filename)
+        try:
+            # Pass the core processing_mode and the specific instruction_file path
+            status, objects = process_file(
+                processing_mode, instruction_file, input_file_path, output_file_path, tags_file, limiter, cache, stream
+            )
+        except Exception:
+            manifest.finish(filename, job_manifest.FAILED)
+            raise
+        manifest.finish(filename, status, objects)
+        return status
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {}
+        for filename, input_file_path, output_filename, output_file_path in jobs:
+            future = pool.submit(run_job, filename, input_file_path, output_file_path)
+            futures[future] = (filename, output_filename)
+        for done, future in enumerate(as_completed(futures), start=1):
+            filename, output_filename = futures[future]
+            try:
+                status = future.result()
+                typer.echo(f"\n[{done}/{len(jobs)}] Finished {filename} -> {output_filename} ({status})")
+            except Exception as e:
+                typer.echo(f"\n[{done}/{len(jobs)}] {filename} failed: {e}", err=True)
+
+    counts = manifest.counts()
+    unfinished = sum(n for status, n in counts.items() if status != job_manifest.DONE)
+    if unfinished:
+        typer.echo(f"\n{unfinished} file(s) not finished ({', '.join(f'{n} {s}' for s, n in sorted(counts.items()))}). Re-run to resume them.")
+    else:
+        typer.echo("\nAll files processed successfully.")
+    if cache is not None:
+        typer.echo(f"Response cache → {cache.format_stats()}")
+        cache.close()
+
+    if profile or trace:
+        metrics.dump(profile, trace)
+        for line in metrics.format_summary():
+            typer.echo(f"  Profile {line}")
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,265 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import typer
+from rich.console import Console
+
+# --- CONFIGURATION ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765           # Same port as AnkiConnect; use another one if Anki is running
+DEFAULT_DECK = "_Others"
+FIELD_NAMES = ["SL", "Question", "OP1", "OP2", "OP3", "OP4", "Answer", "Solution", "Video"]
+SUBJECT_TOPICS = {
+    "MATH": ["Algebra", "Geometry", "Percentage", "Undefined"],
+    "GK": ["History", "Polity", "Undefined"],
+    "GI": ["Coding-Decoding", "Series", "Undefined"],
+    "ENG": ["Synonyms", "Spot-the-Error", "Undefined"],
+}
+
+console = Console()
+
+WORDS = (
+    "the of a to in is what which value find if and then number ratio speed time "
+    "train man work sum interest angle triangle circle price profit loss year"
+).split()
+
+
+# --- Synthetic collection ---
+def make_synthetic_notes(count: int, seed: int = 0, first_id: int = 1700000000000) -> Dict[int, dict]:
+    """Build `count` notes with the repo's field layout, shaped like notesInfo entries."""
+    rng = random.Random(seed)
+    notes: Dict[int, dict] = {}
+    now = int(time.time())
+    for i in range(count):
+        nid = first_id + i
+        subject = rng.choice(list(SUBJECT_TOPICS))
+        topic = rng.choice(SUBJECT_TOPICS[subject])
+        question = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 120)))
+        values = {
+            "SL": str(i + 1),
+            "Question": f"<div>{question}?&nbsp;</div>",
+            "OP1": str(rng.randint(1, 999)),
+            "OP2": str(rng.randint(1, 999)),
+            "OP3": str(rng.randint(1, 999)),
+            "OP4": str(rng.randint(1, 999)),
+            "Answer": rng.choice(["1", "2", "3", "4", "", "Option 2"]),
+            "Solution": "" if rng.random() < 0.5 else " ".join(rng.choice(WORDS) for _ in range(40)),
+            "Video": "",
+        }
+        notes[nid] = {
+            "noteId": nid,
+            "modelName": "MCQ",
+            "mod": now - rng.randint(0, 30 * 86400),
+            "tags": [f"{subject}::{topic}"],
+            "fields": {name: {"value": values[name], "order": order} for order, name in enumerate(FIELD_NAMES)},
+            "cards": [nid + 1],
+        }
+    return notes
+
+
+class FakeCollection:
+    """In-memory stand-in for the parts of Anki that AnkiConnect exposes to our tools."""
+
+    def __init__(self, notes: Dict[int, dict], deck: str = DEFAULT_DECK):
+        self.notes = notes
+        self.deck = deck
+        self.lock = threading.Lock()
+
+    # --- Search ---
+    def find_notes(self, query: str) -> List[int]:
+        ids = sorted(self.notes)
+        nids = re.findall(r"nid:(\d+)", query)
+        if nids:
+            wanted = {int(n) for n in nids}
+            ids = [nid for nid in ids if nid in wanted]
+        deck_match = re.search(r'deck:"([^"]*)"', query) or re.search(r"deck:(\S+)", query)
+        if deck_match and deck_match.group(1).casefold() not in (self.deck.casefold(), "*"):
+            return []
+        edited = re.search(r"edited:(\d+)", query)
+        if edited:
+            cutoff = time.time() - int(edited.group(1)) * 86400
+            ids = [nid for nid in ids if self.notes[nid]["mod"] >= cutoff]
+        return ids
+
+    # --- Actions ---
+    def notes_info(self, notes: List[int]) -> List[dict]:
+        return [json.loads(json.dumps(self.notes[nid])) if nid in self.notes else {} for nid in notes]
+
+    def notes_mod_time(self, notes: List[int]) -> List[dict]:
+        return [{"noteId": nid, "mod": self.notes[nid]["mod"]} for nid in notes if nid in self.notes]
+
+    def update_note_fields(self, note: dict) -> None:
+        nid = note["id"]
+        if nid not in self.notes:
+            raise Exception(f"note was not found: {nid}")
+        fields = self.notes[nid]["fields"]
+        for name, value in note.get("fields", {}).items():
+            if name not in fields:
+                raise Exception(f"field not found: {name}")
+            fields[name]["value"] = value
+        self.notes[nid]["mod"] = int(time.time())
+
+    def update_note(self, note: dict) -> None:
+        """updateNote: fields as in updateNoteFields, plus `tags` replacing the whole tag list."""
+        self.update_note_fields(note)
+        if "tags" in note:
+            self.notes[note["id"]]["tags"] = list(dict.fromkeys(note["tags"]))
+
+    def replace_tags(self, notes: List[int], tag_to_replace: str, replace_with_tag: str) -> None:
+        now = int(time.time())
+        for nid in notes:
+            note = self.notes.get(nid)
+            if note is None:
+                continue
+            if tag_to_replace in note["tags"]:
+                tags = [replace_with_tag if t == tag_to_replace else t for t in note["tags"]]
+                note["tags"] = list(dict.fromkeys(tags))
+                note["mod"] = now
+
+    def dispatch(self, action: str, params: Dict[str, Any]) -> Any:
+        if action == "version":
+            return 6
+        if action == "findNotes":
+            return self.find_notes(params.get("query", ""))
+        if action == "notesInfo":
+            return self.notes_info(params.get("notes", []))
+        if action == "notesModTime":
+            return self.notes_mod_time(params.get("notes", []))
+        if action == "updateNoteFields":
+            return self.update_note_fields(params["note"])
+        if action == "updateNote":
+            return self.update_note(params["note"])
+        if action == "replaceTags":
+            return self.replace_tags(params["notes"], params["tag_to_replace"], params["replace_with_tag"])
+        raise Exception(f"unsupported action: {action}")
+
+
+# --- HTTP server ---
+class FakeAnkiServer(ThreadingHTTPServer):
+    """
+    HTTP server speaking the AnkiConnect JSON protocol.
+    `latency` (seconds, plus up to `jitter`) is added to every request and `error_rate`
+    is the chance that an action returns an injected error. With `serial=True` requests
+    are handled one at a time, like AnkiConnect running on Anki's main thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], collection: FakeCollection, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, serial: bool = True, seed: int = 0):
+        super().__init__(address, FakeAnkiHandler)
+        self.collection = collection
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.serial = serial
+        self.rng = random.Random(seed)
+        self.call_counts: Dict[str, int] = {}  # Per action, including the actions inside 'multi'
+        self.http_requests = 0
+        self.counts_lock = threading.Lock()
+        self.serial_lock = threading.Lock()
+
+    def run_action(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.counts_lock:
+            self.call_counts[action] = self.call_counts.get(action, 0) + 1
+        if action == "multi":
+            return {"result": [self.run_action(a["action"], a.get("params", {})) for a in params.get("actions", [])], "error": None}
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return {"result": None, "error": f"Injected error for {action}"}
+        try:
+            with self.collection.lock:
+                return {"result": self.collection.dispatch(action, params), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+
+class FakeAnkiHandler(BaseHTTPRequestHandler):
+    server: FakeAnkiServer
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def do_POST(self):
+        with self.server.counts_lock:
+            self.server.http_requests += 1
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            payload = None
+            body = {"result": None, "error": f"invalid JSON: {e}"}
+
+        if payload is not None:
+            if self.server.serial:
+                with self.server.serial_lock:
+                    body = self._handle(payload)
+            else:
+                body = self._handle(payload)
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, payload: dict) -> dict:
+        delay = self.server.latency + (self.server.rng.random() * self.server.jitter if self.server.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        return self.server.run_action(payload.get("action", ""), payload.get("params") or {})
+
+
+def start_fake_server(
+    notes: Optional[Dict[int, dict]] = None,
+    count: int = 1000,
+    host: str = DEFAULT_HOST,
+    port: int = 0,
+    deck: str = DEFAULT_DECK,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    serial: bool = True,
+) -> Tuple[FakeAnkiServer, str]:
+    """Start a fake server on a background thread. port=0 picks a free port. Returns (server, url)."""
+    collection = FakeCollection(notes if notes is not None else make_synthetic_notes(count), deck)
+    server = FakeAnkiServer((host, port), collection, latency, jitter, error_rate, serial)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# --- CLI ---
+app = typer.Typer(
+    help="Runs a local fake AnkiConnect server over a synthetic in-memory collection (for load testing without Anki).",
+    add_completion=False,
+)
+
+@app.command()
+def main(
+    notes: int = typer.Option(10000, "--notes", "-n", help="Number of synthetic notes in the collection."),
+    deck: str = typer.Option(DEFAULT_DECK, "--deck", "-d", help="Deck name the synthetic notes live in."),
+    port: int = typer.Option(DEFAULT_PORT, "--port", "-p", help="Port to listen on."),
+    latency_ms: float = typer.Option(0.0, "--latency", help="Fixed latency added to every request, in milliseconds."),
+    jitter_ms: float = typer.Option(0.0, "--jitter", help="Random extra latency of up to this many milliseconds."),
+    error_rate: float = typer.Option(0.0, "--error-rate", help="Probability (0-1) that an action returns an injected error."),
+    parallel: bool = typer.Option(False, "--parallel", help="Handle requests concurrently instead of one at a time like Anki."),
+    seed: int = typer.Option(0, "--seed", help="Random seed for the synthetic collection."),
+):
+    collection = FakeCollection(make_synthetic_notes(notes, seed), deck)
+    server = FakeAnkiServer((DEFAULT_HOST, port), collection, latency_ms / 1000, jitter_ms / 1000, error_rate, not parallel, seed)
+    console.print(f"[i] Fake AnkiConnect with {notes} note(s) in deck \"{deck}\" on http://{DEFAULT_HOST}:{port}", style="cyan")
+    console.print("[i] Point the tools at it with ANKI_CONNECT_URL. Ctrl+C to stop.", style="cyan")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    app()
@@ -1,14 +1,23 @@
 import sys
 import json
-import requests
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 import typer
 from rich.console import Console
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from anki_client import anki_request, format_action_stats, AnkiConnectError, NOTES_INFO_BATCH_SIZE
+import anki_async
+import note_mirror
+import metrics
+from part_files import PartWriter, PART_FORMATS, DEFAULT_PART_FORMAT, part_suffix, is_part_file
+from token_budget import PartPacker, DEFAULT_TOKEN_BUDGET, estimate_prompt_tokens
+from payload_minimizer import minimize_note
+import candidate_filter
+from collection_reader import CollectionReader, default_collection_path
 
 # --- CONFIGURATION (embedded) ---
-ANKI_URL = "http://localhost:8765"  # AnkiConnect URL
 OUTPUT_DIR = Path("./data/input")   # Existing output directory
 OUTPUT_FILENAME = "input.json"      # Default output filename
 ANKI_DEFAULT_DECK = "_Others"  # Default deck name
@@ -16,7 +25,10 @@ ANKI_DEFAULT_DECK = "_Others"  # Default deck name
 # --- NEW CONFIGURATION ---
 OUTPUT_BLANK_DIR = Path("./data/output")  # Directory for blank output files
 OUTPUT_BLANK_FILENAME = "output.json"     # Default blank output file name
-MAX_NOTES_PER_PART = 25                   # Default constant: Maximum notes per part file
+MAX_NOTES_PER_PART = 25                   # Default constant: Maximum notes per part file (secondary cap to the token budget)
+FETCH_BATCH_SIZE = NOTES_INFO_BATCH_SIZE  # Note IDs requested per notesInfo call
+FETCH_WORKERS = 1                         # notesInfo batches in flight at once
+BACKENDS = ("anki", "collection")         # Read backends: AnkiConnect or the collection.anki2 file
 
 # Create directories if they don't exist
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -32,25 +44,41 @@ def log_info(message): console.print(f"[i] {message}", style="cyan")
 def log_task(message): console.print(f"[*] {message}", style="magenta")
 
 # --- AnkiConnect helpers ---
-def anki_request(action: str, params: Optional[dict] = None):
+def fetch_note_ids(deck_name: str, mode: Optional[str] = None) -> List[int]:
+    query = candidate_filter.search_query(deck_name, mode)
     try:
-        if params is None:
-            params = {}
-        response = requests.post(ANKI_URL, json={'action': action, 'version': 6, 'params': params})
-        response.raise_for_status()
-        result = response.json()
-        if 'error' in result and result['error']:
-            raise Exception(result['error'])
-        return result['result']
-    except Exception as e:
-        raise e
-
-def fetch_note_ids(deck_name: str) -> List[int]:
-    return anki_request('findNotes', {'query': f'deck:"{deck_name}"'})
+        return anki_request('findNotes', {'query': query})
+    except AnkiConnectError as e:
+        if query == f'deck:"{deck_name}"':
+            raise
+        # Older Anki versions reject regex field searches; filter locally instead
+        log_warn(f"Anki rejected the pre-filter query ({e}); fetching the whole deck.")
+        return anki_request('findNotes', {'query': f'deck:"{deck_name}"'})
 
 def fetch_note_details(note_ids: List[int]) -> List[dict]:
     return anki_request('notesInfo', {'notes': note_ids})
 
+def iter_note_details(note_ids: List[int], batch_size: int = FETCH_BATCH_SIZE, workers: int = FETCH_WORKERS) -> Iterator[List[dict]]:
+    """
+    Yield notesInfo results batch by batch, in note ID order.
+    With workers > 1, up to `workers` batches are fetched concurrently.
+    """
+    batch_size = max(1, batch_size)
+    batches = (note_ids[i:i + batch_size] for i in range(0, len(note_ids), batch_size))
+    if workers <= 1:
+        for batch in batches:
+            yield fetch_note_details(batch)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for batch in batches:
+            if len(in_flight) >= workers:
+                yield in_flight.popleft().result()
+            in_flight.append(pool.submit(fetch_note_details, batch))
+        while in_flight:
+            yield in_flight.popleft().result()
+
 def process_notes(notes: List[dict], exclude_fields: Optional[List[str]] = None) -> List[dict]:
     if exclude_fields is None:
         exclude_fields = []
@@ -84,7 +112,9 @@ def clean_input_directory():
     try:
         log_task(f"Cleaning all *.json files in {OUTPUT_DIR}...")
         deleted_count = 0
-        for file_path in OUTPUT_DIR.glob("*.json"):
+        for file_path in OUTPUT_DIR.glob("*.json*"):
+            if not is_part_file(file_path):
+                continue
             file_path.unlink()
             deleted_count += 1
         log_info(f"Successfully deleted {deleted_count} old input .json file(s).")
@@ -139,19 +169,47 @@ def save_noteid_list(note_ids: List[int]):
         log_error(f"Failed to save note ID list: {e}")
 
 # MODIFIED: Added max_notes_per_part argument
-def run_fetch_notes(deck: str, exclude: Optional[List[str]] = None, max_notes_per_part: int = MAX_NOTES_PER_PART):
+def run_fetch_notes(
+    deck: str,
+    exclude: Optional[List[str]] = None,
+    max_notes_per_part: int = MAX_NOTES_PER_PART,
+    fetch_batch_size: int = FETCH_BATCH_SIZE,
+    fetch_workers: int = FETCH_WORKERS,
+    incremental: bool = False,
+    backend: str = "anki",
+    collection_path: Optional[Path] = None,
+    use_async: bool = False,
+    part_format: str = DEFAULT_PART_FORMAT,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    minimize: bool = False,
+    mode: Optional[str] = None,
+):
+    reader: Optional[CollectionReader] = None
     try:
         # --- 1. CLEAN INPUT AND OUTPUT DIRECTORIES ---
         clean_input_directory()
         clean_output_directory()
 
         # --- 2. FETCH DATA FROM ANKI ---
-        log_task(f'Fetching note IDs from deck "{deck}"...')
-        note_ids = fetch_note_ids(deck)
+        if backend == "collection":
+            collection_path = collection_path or default_collection_path()
+            if collection_path is None:
+                log_error("No collection path given and no 'anki_path' in configs/config.json.")
+                return
+            log_task(f'Opening collection "{collection_path}" (read-only)...')
+            reader = CollectionReader(collection_path)
+            if incremental:
+                log_warn("--incremental is ignored with the collection backend (it reads everything locally).")
+                incremental = False
+            log_task(f'Reading note IDs from deck "{deck}"...')
+            note_ids = reader.find_note_ids(deck)
+        else:
+            log_task(f'Fetching note IDs from deck "{deck}"...')
+            note_ids = fetch_note_ids(deck, mode)
         total_notes = len(note_ids)
 
         if not note_ids:
-            log_warn(f'No notes found in deck "{deck}".')
+            log_warn(f'No notes found in deck "{deck}"' + (f" that need work in {mode} mode." if mode else "."))
             # Create a single blank output file (cleaning is already done)
             create_blank_output_files(num_parts=1)
             return
@@ -161,9 +219,6 @@ def run_fetch_notes(deck: str, exclude: Optional[List[str]] = None, max_notes_pe
         # --- Save note ID list ---
         save_noteid_list(note_ids)
 
-        log_task('Fetching full details for all notes...')
-        notes_info = fetch_note_details(note_ids)
-
         # --- Apply Default Exclusion (Solution and Video) ---
         final_exclude = set(exclude or [])
         final_exclude.add('Solution') # DEFAULT EXCLUSION ADDED
@@ -171,40 +226,128 @@ def run_fetch_notes(deck: str, exclude: Optional[List[str]] = None, max_notes_pe
         final_exclude_list = list(final_exclude)
         # ------------------------------------------
 
-        log_task(f'Processing note data (excluding: {final_exclude_list or "None"})...')
-        processed_notes = process_notes(notes_info, final_exclude_list)
-        log_success('Note details processed successfully.')
-        
-        # --- 3. SAVE INPUT AND BLANK OUTPUT FILES ---
-
-        # Splitting into parts with the provided limit (max_notes_per_part)
-        chunks = [processed_notes[i:i + max_notes_per_part] 
-                  for i in range(0, total_notes, max_notes_per_part)]
-        
-        num_parts = len(chunks)
-
-        if num_parts > 1:
+        # --- 3. FETCH, PROCESS AND SAVE IN BATCHES ---
+        # Notes are fetched in batches of fetch_batch_size and written to part
+        # files as soon as a part is full, so memory stays bounded by the batch
+        # size instead of the deck size. A part is full when its estimated
+        # prompt + response tokens reach the budget or it holds max_notes_per_part notes.
+        packer = PartPacker(max_notes_per_part, token_budget, mode=mode)
+        if token_budget > 0:
+            log_info(f"Packing notes into parts of up to ~{token_budget} estimated tokens (max {max_notes_per_part} notes per part).")
+        elif total_notes > max_notes_per_part:
             # MODIFIED: Used max_notes_per_part for logging
-            log_info(f"Splitting notes into {num_parts} parts (max {max_notes_per_part} notes per part).")
-            for i, chunk in enumerate(chunks, start=1):
-                output_path = OUTPUT_DIR / f"input-{i}.json"
-                log_task(f'Saving part {i}/{num_parts} to "{output_path}"...')
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(chunk, f, ensure_ascii=False, indent=2)
-                log_success(f'Part {i} exported to → "{output_path}"')
+            expected_parts = -(-total_notes // max_notes_per_part)
+            log_info(f"Splitting notes into {expected_parts} parts (max {max_notes_per_part} notes per part).")
+
+        if reader is not None:
+            note_batches = reader.iter_notes(note_ids, fetch_batch_size)
+        elif incremental:
+            log_task(f'Refreshing local note mirror "{note_mirror.MIRROR_PATH}"...')
+            mirror = note_mirror.connect()
+            # A mode-filtered ID list is not the whole deck, so let the mirror run its own deck query
+            deck_ids, fetched, removed = note_mirror.refresh_deck(mirror, deck, fetch_batch_size, None if mode else note_ids)
+            # The mirror syncs the whole deck, so both counts are over the deck, not the mode-filtered IDs
+            log_info(f"Incremental sync: {fetched} changed note(s) fetched, {len(deck_ids) - fetched} served from mirror, {removed} removed.")
+            note_batches = note_mirror.iter_notes(mirror, note_ids, fetch_batch_size)
+        elif use_async:
+            log_task(f'Fetching full details in batches of {fetch_batch_size} (asyncio, {max(1, fetch_workers)} in flight)...')
+            note_batches = anki_async.iter_notes_info(note_ids, fetch_batch_size, max(1, fetch_workers))
         else:
-            # Case: 0 to limit notes (saved as a single file: input.json)
-            output_path = OUTPUT_DIR / OUTPUT_FILENAME
-            log_task(f'Saving notes to "{output_path}"...')
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(processed_notes, f, ensure_ascii=False, indent=2)
-            log_success(f'Notes exported to → "{output_path}"')
+            log_task(f'Fetching full details in batches of {fetch_batch_size}...')
+            note_batches = iter_note_details(note_ids, fetch_batch_size, fetch_workers)
+        log_task(f'Processing note data (excluding: {final_exclude_list or "None"})...')
+
+        num_parts = 0
+        processed_count = 0
+        filtered_count = 0
+        writer: Optional[PartWriter] = None
+        part_saved_tokens = 0  # Estimated prompt tokens removed by the minimizer in the current part
+
+        # Notes are streamed straight into the current part file; a new part is
+        # started once the packer says the current one is full. Parts are named
+        # input-N until the end, when a lone part becomes input.json.
+        def open_part() -> PartWriter:
+            nonlocal num_parts, part_saved_tokens
+            num_parts += 1
+            packer.reset()
+            part_saved_tokens = 0
+            output_path = OUTPUT_DIR / f"input-{num_parts}{part_suffix(part_format)}"
+            log_task(f'Saving part {num_parts} to "{output_path}"...')
+            return PartWriter(output_path, part_format)
+
+        def close_part(part: PartWriter):
+            part.close()
+            metrics.count("file.parts_written")
+            metrics.count("file.bytes_written", part.bytes_written)
+            metrics.count("tokens.estimated_prompt", packer.prompt_tokens)
+            metrics.count("tokens.estimated_response", packer.response_tokens)
+            saved = ""
+            if minimize:
+                metrics.count("tokens.saved_by_minimizer", part_saved_tokens)
+                saved = f", ~{part_saved_tokens} saved by minimizing"
+            log_success(
+                f'Part {num_parts} exported to → "{part.path}" '
+                f'({part.count} note(s), ~{packer.prompt_tokens + packer.response_tokens} tokens{saved})'
+            )
+
+        try:
+            for notes_batch in note_batches:
+                if mode:
+                    candidates = [note for note in notes_batch if candidate_filter.needs_work(note, mode)]
+                    filtered_count += len(notes_batch) - len(candidates)
+                    notes_batch = candidates
+                with metrics.span("process_notes", "parse"):
+                    processed = process_notes(notes_batch, final_exclude_list)
+                if mode == "all":
+                    for note, raw_note in zip(processed, notes_batch):
+                        note[candidate_filter.SOLUTION_FLAG] = candidate_filter.needs_work(raw_note, "solution")
+                processed_count += len(processed)
+                with metrics.span("file.write_part", "io"):
+                    for note in processed:
+                        raw_tokens = estimate_prompt_tokens(note) if minimize else 0
+                        if minimize:
+                            note = minimize_note(note)
+                        cost = packer.cost(note)
+                        if writer is not None and not packer.fits(cost):
+                            close_part(writer)
+                            writer = None
+                        if writer is None:
+                            writer = open_part()
+                        writer.write(note)
+                        packer.add(cost)
+                        if minimize:
+                            part_saved_tokens += raw_tokens - cost[0]
+
+            if writer is None and num_parts == 0:
+                writer = open_part()
+            if writer is not None:
+                close_part(writer)
+                writer = None
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if num_parts == 1:
+            single_path = OUTPUT_DIR / f"input-1{part_suffix(part_format)}"
+            final_path = (OUTPUT_DIR / OUTPUT_FILENAME).with_suffix(part_suffix(part_format))
+            single_path.replace(final_path)
+            log_success(f'Notes exported to → "{final_path}"')
+        if mode:
+            metrics.count("prefilter.skipped", filtered_count)
+            log_info(f"Pre-filter ({mode}): {filtered_count} note(s) need no work and were left out.")
+        log_success(f'{processed_count} note(s) processed successfully.')
 
         # Create blank output files in data/output (cleaning was done in step 1)
         create_blank_output_files(num_parts)
 
+        for line in format_action_stats():
+            log_info(f"AnkiConnect {line}")
+
     except Exception as e:
         log_error(f"An error occurred during the fetch process: {e}")
+    finally:
+        if reader is not None:
+            reader.close()
 
 # --- Typer CLI App ---
 app = typer.Typer(
@@ -229,12 +372,72 @@ def main(
         MAX_NOTES_PER_PART, # Use the global constant as the default value
         "--limit", "-l",
         help=f"Maximum number of notes to include in a single part file (default: {MAX_NOTES_PER_PART})."
+    ),
+    fetch_batch: int = typer.Option(
+        FETCH_BATCH_SIZE,
+        "--fetch-batch",
+        help=f"Number of note IDs requested per notesInfo call (default: {FETCH_BATCH_SIZE})."
+    ),
+    fetch_workers: int = typer.Option(
+        FETCH_WORKERS,
+        "--fetch-workers",
+        help=f"Number of notesInfo batches fetched concurrently (default: {FETCH_WORKERS})."
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental", "-i",
+        help="Only download notes modified since the last run and rebuild part files from the local SQLite mirror in ./data/cache."
+    ),
+    backend: str = typer.Option(
+        "anki",
+        "--backend", "-b",
+        help="Where to read notes from: 'anki' (AnkiConnect, default) or 'collection' (read collection.anki2 directly; Anki does not need to be running)."
+    ),
+    collection: Optional[Path] = typer.Option(
+        None,
+        "--collection",
+        help="Path to collection.anki2 for --backend collection (default: 'anki_path' from configs/config.json)."
+    ),
+    token_budget: int = typer.Option(
+        DEFAULT_TOKEN_BUDGET,
+        "--token-budget", "-t",
+        help=f"Estimated prompt + response tokens per part file (default: {DEFAULT_TOKEN_BUDGET}; 0 splits by --limit only)."
+    ),
+    mode: Optional[str] = typer.Option(
+        None,
+        "--mode", "-m",
+        help=f"Only export notes that need work in this generation mode: {', '.join(candidate_filter.MODES)}."
+    ),
+    minimize: bool = typer.Option(
+        False,
+        "--minimize/--no-minimize",
+        help="Also minimize notes at export time (smaller part files). The generator always minimizes what it sends, so this is off by default."
+    ),
+    part_format: str = typer.Option(
+        DEFAULT_PART_FORMAT,
+        "--format", "-f",
+        help=f"Part file format: {', '.join(PART_FORMATS)} (compact JSON by default; 'pretty' is indented for reading)."
+    ),
+    use_async: bool = typer.Option(
+        False,
+        "--async",
+        help="Pipeline notesInfo batches on the asyncio client (needs httpx); --fetch-workers sets how many are in flight."
+    ),
+    profile: Optional[Path] = typer.Option(
+        None,
+        "--profile",
+        help="Write a JSON metrics summary (timings, call and byte counts) to this path."
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        "--trace",
+        help="Also write a Chrome-trace file (open in chrome://tracing or Perfetto)."
     )
 ):
     """
     Fetch Anki notes, clean existing .json files in data/input and data/output, and export to new files.
     'Solution' and 'Video' are excluded by default.
-    Notes are automatically split into files with a maximum set by --limit (default 25) notes per file (e.g., input-1.json, input-2.json, ...).
+    Notes are packed into files of up to --token-budget estimated tokens and at most --limit (default 25) notes each (e.g., input-1.json, input-2.json, ...).
     Also saves a note ID list to ./data/input/noteid_list.txt in 'nid:<id> OR nid:<id>' format.
     """
     if exclude:
@@ -245,7 +448,32 @@ def main(
         exclude = split_exclude
 
     # MODIFIED: Passed the new limit argument
-    run_fetch_notes(deck, exclude, limit)
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        log_error(f"Invalid backend '{backend}'. Must be one of: {', '.join(BACKENDS)}")
+        raise typer.Exit(code=1)
+
+    if profile or trace:
+        metrics.enable(trace=trace is not None)
+
+    if mode is not None:
+        mode = mode.lower()
+        if mode not in candidate_filter.MODES:
+            log_error(f"Invalid mode '{mode}'. Must be one of: {', '.join(candidate_filter.MODES)}")
+            raise typer.Exit(code=1)
+
+    part_format = part_format.lower()
+    if part_format not in PART_FORMATS:
+        log_error(f"Invalid format '{part_format}'. Must be one of: {', '.join(PART_FORMATS)}")
+        raise typer.Exit(code=1)
+
+    run_fetch_notes(deck, exclude, limit, fetch_batch, fetch_workers, incremental, backend, collection, use_async, part_format, token_budget, minimize, mode)
+
+    if profile or trace:
+        metrics.dump(profile, trace)
+        for line in metrics.format_summary():
+            log_info(f"Profile {line}")
+        log_success(f"Profile written → {profile or ''} {trace or ''}".rstrip())
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
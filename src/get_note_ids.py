@@ -1,11 +1,10 @@
-import requests
 import typer
 from pathlib import Path
 from typing import Optional, List, Any
 from rich.console import Console
+from anki_client import get_client
 
 # --- Configuration ---
-ANKI_CONNECT_URL = "http://127.0.0.1:8765"
 # Define the output path relative to where the script is run (project root)
 OUTPUT_FILE = Path("data/list-of-noteid.txt")
 
@@ -21,17 +20,7 @@ def anki_request(action: str, params: Optional[dict] = None) -> Any:
         params = {}
     
     try:
-        response = requests.post(
-            ANKI_CONNECT_URL, 
-            json={"action": action, "version": 6, "params": params}
-        )
-        response.raise_for_status()
-        result = response.json()
-        
-        if result.get("error"):
-            raise Exception(result["error"])
-            
-        return result.get("result")
+        return get_client().request(action, params)
     except Exception as e:
         console.print(f"[bold red]Error communicating with AnkiConnect:[/bold red] {e}")
         raise typer.Exit(code=1)
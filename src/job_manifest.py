@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# --- CONFIGURATION ---
+MANIFEST_FILENAME = "manifest.json"  # Lives in the output directory, next to the output-*.json files
+
+# Job states
+PENDING = "pending"    # Not started in this run yet
+RUNNING = "running"    # Started; still "running" after a crash means it never finished
+DONE = "done"          # Output written from a complete model answer (or nothing to change)
+PARTIAL = "partial"    # Only some objects arrived (broken stream / truncated array); resend
+FAILED = "failed"      # No usable answer; resend
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_is_valid(path: str) -> bool:
+    """An output file counts only if it is a JSON array (failed runs leave an {"error": ...} object)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return isinstance(json.load(f), list)
+    except (OSError, json.JSONDecodeError):
+        return False
+
+
+class JobManifest:
+    """
+    Per-run record of every input part: content hash, status, attempts and output path.
+    A run is identified by `run_key` (model, mode, instructions); a manifest written by a
+    different run is discarded. The file is rewritten atomically after every change, so a
+    crash leaves the state of the last finished part on disk. Safe to share between worker threads.
+    """
+
+    def __init__(self, path: Path, run_key: str, resume: bool = True):
+        self.path = path
+        self.run_key = run_key
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        if resume:
+            loaded = self._load()
+            if loaded is not None and loaded.get("run_key") == run_key:
+                self.jobs = loaded.get("jobs", {})
+
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else None
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"run_key": self.run_key, "updated": time.time(), "jobs": self.jobs}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_finished(self, name: str, input_hash: str) -> bool:
+        """True if the part was completed from this exact input and its output is still valid."""
+        job = self.jobs.get(name)
+        if job is None or job.get("status") != DONE or job.get("input_hash") != input_hash:
+            return False
+        # A complete answer with nothing to change writes no output file
+        return job.get("objects") == 0 or output_is_valid(job.get("output", ""))
+
+    def register(self, name: str, input_hash: str, output_path: str):
+        """Add or reset a part that has to be (re)processed in this run."""
+        with self._lock:
+            job = self.jobs.get(name)
+            if job is None or job.get("input_hash") != input_hash:
+                job = {"input_hash": input_hash, "attempts": 0}
+                self.jobs[name] = job
+            job.update(status=PENDING, output=output_path)
+            self._save()
+
+    def retain(self, names):
+        """Forget parts that are no longer in the input directory (e.g. after a new fetch)."""
+        with self._lock:
+            keep = set(names)
+            self.jobs = {name: job for name, job in self.jobs.items() if name in keep}
+            self._save()
+
+    def start(self, name: str):
+        with self._lock:
+            job = self.jobs[name]
+            job["status"] = RUNNING
+            job["attempts"] = job.get("attempts", 0) + 1
+            job["started"] = time.time()
+            self._save()
+
+    def finish(self, name: str, status: str, objects: int = 0):
+        with self._lock:
+            job = self.jobs[name]
+            job.update(status=status, objects=objects, finished=time.time())
+            self._save()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            totals: Dict[str, int] = {}
+            for job in self.jobs.values():
+                totals[job["status"]] = totals.get(job["status"], 0) + 1
+            return totals
@@ -0,0 +1,38 @@
+import json
+from typing import List, Tuple
+
+from stream_parser import JsonArrayStreamParser
+
+
+def extract_objects(text: str) -> Tuple[List[dict], int]:
+    """Like extract_with_errors(), but returns only (objects, number of malformed elements skipped)."""
+    objects, malformed = extract_with_errors(text)
+    return objects, len(malformed)
+
+
+def extract_with_errors(text: str) -> Tuple[List[dict], List[str]]:
+    """
+    Pull every decodable object out of a (possibly damaged) JSON array of objects.
+    A well-formed array is decoded with a single json.loads. Otherwise one forward scan that
+    tracks strings and escapes (JsonArrayStreamParser) finds where each element ends, and
+    each element is decoded on its own, so braces, quotes and '}, {' inside strings never
+    split an object and a malformed element costs only its own length. The whole pass is
+    linear in the size of the text.
+    Returns (objects, raw text of every malformed element skipped, including an unfinished last one).
+    """
+    start, end = text.find("["), text.rfind("]")
+    if 0 <= start < end:
+        try:
+            data = json.loads(text[start:end + 1], strict=False)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(data, list):
+                return [obj for obj in data if isinstance(obj, dict)], []
+
+    parser = JsonArrayStreamParser()
+    objects = parser.feed(text)
+    malformed = list(parser.malformed_texts)
+    if parser.unfinished():
+        malformed.append(parser.unfinished())
+    return objects, malformed
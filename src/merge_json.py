@@ -2,25 +2,28 @@ import json
 import glob
 from pathlib import Path
 
+from part_files import read_part
+
 # Paths
 input_path = Path(__file__).parent.parent / "data/input"
 output_path = Path(__file__).parent.parent / "data/output"
 
 # Function to merge JSON part files and delete them afterwards
-def merge_json_parts(file_pattern, output_file):
+def merge_json_parts(file_patterns, output_file):
     merged_data = []
-    part_files = sorted(glob.glob(str(file_pattern)))
+    if isinstance(file_patterns, (str, Path)):
+        file_patterns = [file_patterns]
+    part_files = sorted(f for pattern in file_patterns for f in glob.glob(str(pattern)))
 
     # Skip the final merged file if it exists
     part_files = [f for f in part_files if f != str(output_file)]
+    if not part_files:
+        # Nothing to merge: never replace an existing merged file with an empty one
+        return
 
     for file_path in part_files:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                merged_data.extend(data)
-            else:
-                merged_data.append(data)
+        # .json parts hold an array (or a single object), .jsonl parts one object per line
+        merged_data.extend(read_part(Path(file_path)))
 
     # Write merged data
     with open(output_file, "w", encoding="utf-8") as f:
@@ -30,10 +33,17 @@ def merge_json_parts(file_pattern, output_file):
     for file_path in part_files:
         Path(file_path).unlink()
 
-# Merge input part files -> input.json
-merge_json_parts(input_path / "input-*.json", input_path / "input.json")
+def merge_all(input_dir: Path = input_path, output_dir: Path = output_path):
+    # Merge input part files -> input.json
+    # (a single-part JSONL fetch is converted to input.json as well)
+    merge_json_parts(
+        [input_dir / "input-*.json", input_dir / "input-*.jsonl", input_dir / "input.jsonl"],
+        input_dir / "input.json",
+    )
 
-# Merge output part files -> output.json
-merge_json_parts(output_path / "output-*.json", output_path / "output.json")
+    # Merge output part files -> output.json
+    merge_json_parts(output_dir / "output-*.json", output_dir / "output.json")
 
-print("All JSON part files merged and deleted successfully!")
+if __name__ == "__main__":
+    merge_all()
+    print("All JSON part files merged and deleted successfully!")
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Lightweight, process-wide instrumentation shared by the CLI tools.
+# Everything is a no-op until enable() is called (normally via a --profile option).
+
+_lock = threading.Lock()
+_enabled = False
+_tracing = False
+_started_at = time.perf_counter()
+_spans: Dict[str, Dict[str, float]] = {}
+_counters: Dict[str, float] = {}
+_trace_events: List[Dict[str, Any]] = []
+
+
+def enable(trace: bool = False):
+    """Start collecting metrics. With trace=True every span is also kept as a Chrome-trace event."""
+    global _enabled, _tracing, _started_at
+    with _lock:
+        _enabled = True
+        _tracing = trace
+        _started_at = time.perf_counter()
+        _spans.clear()
+        _counters.clear()
+        _trace_events.clear()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def span(name: str, category: str = "app", **args) -> Iterator[None]:
+    """Time a block. Spans with the same name are aggregated (count, total, max)."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        elapsed = end - start
+        with _lock:
+            entry = _spans.setdefault(name, {"category": category, "count": 0, "total_s": 0.0, "max_s": 0.0})
+            entry["count"] += 1
+            entry["total_s"] += elapsed
+            entry["max_s"] = max(entry["max_s"], elapsed)
+            if _tracing:
+                _trace_events.append({
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start - _started_at) * 1e6,
+                    "dur": elapsed * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": args,
+                })
+
+
+def count(name: str, value: float = 1):
+    """Add to a named counter (calls, bytes, tokens, ...)."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def summary() -> Dict[str, Any]:
+    with _lock:
+        spans = {
+            name: {**entry, "avg_s": entry["total_s"] / entry["count"] if entry["count"] else 0.0}
+            for name, entry in _spans.items()
+        }
+        return {
+            "wall_s": time.perf_counter() - _started_at,
+            "spans": dict(sorted(spans.items(), key=lambda kv: kv[1]["total_s"], reverse=True)),
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def dump(summary_path: Optional[Path], trace_path: Optional[Path] = None):
+    """Write the JSON summary and, if requested and recorded, a Chrome-trace file (chrome://tracing, Perfetto)."""
+    if summary_path is not None:
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary(), f, indent=2)
+    if trace_path is not None:
+        with _lock:
+            events = list(_trace_events)
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def format_summary(limit: int = 10) -> List[str]:
+    """Human-readable lines for the slowest spans and all counters."""
+    data = summary()
+    lines = [f"Wall time: {data['wall_s']:.2f}s"]
+    for name, entry in list(data["spans"].items())[:limit]:
+        lines.append(
+            f"{name}: {entry['count']} call(s), total {entry['total_s']:.2f}s, "
+            f"avg {entry['avg_s'] * 1000:.1f}ms, max {entry['max_s'] * 1000:.1f}ms"
+        )
+    for name, value in data["counters"].items():
+        lines.append(f"{name}: {value:g}")
+    return lines
@@ -0,0 +1,40 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from anki_client import anki_request, AnkiConnectError
+
+# --- CONFIGURATION ---
+MOD_TIME_BATCH_SIZE = 5000         # Note IDs per notesModTime request (the response is tiny)
+
+
+# --- Change detection ---
+def fetch_mod_times(note_ids: List[int], batch_size: int = MOD_TIME_BATCH_SIZE) -> Dict[int, int]:
+    """Return {noteId: mod} using AnkiConnect's notesModTime action."""
+    mod_times: Dict[int, int] = {}
+    for i in range(0, len(note_ids), batch_size):
+        for entry in anki_request("notesModTime", {"notes": note_ids[i:i + batch_size]}) or []:
+            mod_times[entry["noteId"]] = entry["mod"]
+    return mod_times
+
+
+def find_changed_note_ids(
+    deck: str, note_ids: List[int], cached_mods: Dict[int, int], last_sync: float
+) -> Tuple[List[int], Dict[int, Optional[int]]]:
+    """
+    Work out which notes must be re-fetched.
+    Returns (changed_ids, known_mods). known_mods holds the current mod time when it is known.
+    Uses notesModTime when available, otherwise falls back to an 'edited:N' search.
+    """
+    try:
+        mod_times = fetch_mod_times(note_ids)
+        changed = [nid for nid in note_ids if cached_mods.get(nid) != mod_times.get(nid)]
+        return changed, dict(mod_times)
+    except AnkiConnectError:
+        # Older AnkiConnect without notesModTime: ask Anki for recently edited notes
+        days = max(1, math.ceil((time.time() - last_sync) / 86400)) if last_sync else None
+        if days is None:
+            return list(note_ids), {}
+        edited = set(anki_request("findNotes", {"query": f'deck:"{deck}" edited:{days}'}) or [])
+        changed = [nid for nid in note_ids if nid in edited or nid not in cached_mods]
+        return changed, {}
@@ -0,0 +1,215 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from anki_client import anki_request, iter_notes_info, NOTES_INFO_BATCH_SIZE
+from note_cache import find_changed_note_ids
+
+# --- CONFIGURATION ---
+MIRROR_PATH = Path("./data/cache/notes.sqlite3")  # Local SQLite mirror shared by all tools
+VALID_SUBJECTS = {"MATH", "GK", "GI", "ENG", "BENG", "COMPUTER"}
+SQL_VARIABLE_CHUNK = 900  # Stay under SQLite's host-parameter limit for IN (...) queries
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    note_id   INTEGER PRIMARY KEY,
+    deck      TEXT,
+    model     TEXT,
+    mod       INTEGER,
+    subject   TEXT,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    note_id INTEGER NOT NULL,
+    name    TEXT NOT NULL,
+    ord     INTEGER NOT NULL,
+    value   TEXT NOT NULL,
+    PRIMARY KEY (note_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tags (
+    note_id INTEGER NOT NULL,
+    tag     TEXT NOT NULL,
+    PRIMARY KEY (note_id, tag)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS decks (
+    deck      TEXT PRIMARY KEY,
+    last_sync REAL
+);
+CREATE INDEX IF NOT EXISTS idx_notes_deck ON notes(deck);
+CREATE INDEX IF NOT EXISTS idx_notes_subject ON notes(subject);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags(tag);
+"""
+
+
+def connect(path: Path = MIRROR_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the mirror database."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def subject_of(tags: Iterable[str]) -> Optional[str]:
+    """Base subject of the first well-formed 'Subject::Topic' tag, if any."""
+    for tag in tags:
+        if tag.count("::") == 1:
+            base = tag.split("::")[0]
+            if base in VALID_SUBJECTS:
+                return base
+    return None
+
+
+def _chunks(values: List[int], size: int = SQL_VARIABLE_CHUNK) -> Iterator[List[int]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+# --- Writes ---
+def upsert_notes(conn: sqlite3.Connection, notes: List[dict], deck: Optional[str] = None, mods: Optional[Dict[int, int]] = None):
+    """Insert or replace notesInfo entries. `deck` is kept from the previous row when not given."""
+    now = time.time()
+    mods = mods or {}
+    with conn:
+        for note in notes:
+            if not note or note.get("noteId") is None:
+                continue
+            nid = note["noteId"]
+            tags = note.get("tags", [])
+            conn.execute(
+                """
+                INSERT INTO notes (note_id, deck, model, mod, subject, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(note_id) DO UPDATE SET
+                    deck = COALESCE(excluded.deck, notes.deck),
+                    model = excluded.model,
+                    mod = excluded.mod,
+                    subject = excluded.subject,
+                    synced_at = excluded.synced_at
+                """,
+                (nid, deck, note.get("modelName"), mods.get(nid, note.get("mod")), subject_of(tags), now),
+            )
+            conn.execute("DELETE FROM fields WHERE note_id = ?", (nid,))
+            conn.executemany(
+                "INSERT INTO fields (note_id, name, ord, value) VALUES (?, ?, ?, ?)",
+                [
+                    (nid, name, field.get("order", 0), field.get("value", ""))
+                    for name, field in note.get("fields", {}).items()
+                ],
+            )
+            conn.execute("DELETE FROM tags WHERE note_id = ?", (nid,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO tags (note_id, tag) VALUES (?, ?)", [(nid, tag) for tag in tags]
+            )
+
+
+def delete_notes(conn: sqlite3.Connection, note_ids: List[int]):
+    with conn:
+        for chunk in _chunks(note_ids):
+            marks = ",".join("?" * len(chunk))
+            for table in ("fields", "tags", "notes"):
+                conn.execute(f"DELETE FROM {table} WHERE note_id IN ({marks})", chunk)
+
+
+# --- Incremental refresh ---
+def refresh_notes(
+    conn: sqlite3.Connection,
+    note_ids: List[int],
+    deck: Optional[str] = None,
+    last_sync: float = 0,
+    batch_size: int = NOTES_INFO_BATCH_SIZE,
+) -> int:
+    """Re-fetch only the notes in `note_ids` whose mod time differs from the mirror. Returns the number fetched."""
+    cached_mods = mod_times(conn, note_ids)
+    changed, known_mods = find_changed_note_ids(deck or "", note_ids, cached_mods, last_sync if deck else 0)
+    for batch in iter_notes_info(changed, batch_size):
+        upsert_notes(conn, batch, deck, known_mods)
+    return len(changed)
+
+
+def refresh_deck(
+    conn: sqlite3.Connection,
+    deck: str,
+    batch_size: int = NOTES_INFO_BATCH_SIZE,
+    note_ids: Optional[List[int]] = None,
+) -> Tuple[List[int], int, int]:
+    """
+    Bring the mirror of one deck up to date with Anki.
+    Pass `note_ids` when the caller already ran findNotes for the deck.
+    Returns (deck_note_ids, fetched_count, removed_count).
+    """
+    sync_started = time.time()
+    if note_ids is None:
+        note_ids = anki_request("findNotes", {"query": f'deck:"{deck}"'}) or []
+    row = conn.execute("SELECT last_sync FROM decks WHERE deck = ?", (deck,)).fetchone()
+    fetched = refresh_notes(conn, note_ids, deck, row[0] if row else 0, batch_size)
+
+    wanted = set(note_ids)
+    stale = [nid for (nid,) in conn.execute("SELECT note_id FROM notes WHERE deck = ?", (deck,)) if nid not in wanted]
+    delete_notes(conn, stale)
+
+    with conn:
+        conn.execute(
+            "INSERT INTO decks (deck, last_sync) VALUES (?, ?) ON CONFLICT(deck) DO UPDATE SET last_sync = excluded.last_sync",
+            (deck, sync_started),
+        )
+    return note_ids, fetched, len(stale)
+
+
+# --- Reads ---
+def mod_times(conn: sqlite3.Connection, note_ids: List[int]) -> Dict[int, int]:
+    result: Dict[int, int] = {}
+    for chunk in _chunks(note_ids):
+        marks = ",".join("?" * len(chunk))
+        result.update(conn.execute(f"SELECT note_id, mod FROM notes WHERE note_id IN ({marks})", chunk).fetchall())
+    return result
+
+
+def note_ids_for_deck(conn: sqlite3.Connection, deck: str) -> List[int]:
+    return [nid for (nid,) in conn.execute("SELECT note_id FROM notes WHERE deck = ? ORDER BY note_id", (deck,))]
+
+
+def note_ids_for_subject(conn: sqlite3.Connection, subject: str, deck: Optional[str] = None) -> List[int]:
+    if deck is None:
+        rows = conn.execute("SELECT note_id FROM notes WHERE subject = ? ORDER BY note_id", (subject,))
+    else:
+        rows = conn.execute("SELECT note_id FROM notes WHERE subject = ? AND deck = ? ORDER BY note_id", (subject, deck))
+    return [nid for (nid,) in rows]
+
+
+def tags_for_deck(conn: sqlite3.Connection, deck: str) -> Dict[int, List[str]]:
+    """{noteId: [tags]} for every note of a deck (notes without tags map to [])."""
+    result: Dict[int, List[str]] = {nid: [] for nid in note_ids_for_deck(conn, deck)}
+    rows = conn.execute(
+        "SELECT t.note_id, t.tag FROM tags t JOIN notes n ON n.note_id = t.note_id WHERE n.deck = ? ORDER BY t.note_id, t.tag",
+        (deck,),
+    )
+    for nid, tag in rows:
+        result[nid].append(tag)
+    return result
+
+
+def notes_info_map(conn: sqlite3.Connection, note_ids: List[int]) -> Dict[int, dict]:
+    """Rebuild notesInfo-shaped dicts ({noteId, modelName, mod, tags, fields}) from the mirror."""
+    result: Dict[int, dict] = {}
+    for chunk in _chunks(note_ids):
+        marks = ",".join("?" * len(chunk))
+        for nid, model, mod in conn.execute(f"SELECT note_id, model, mod FROM notes WHERE note_id IN ({marks})", chunk):
+            result[nid] = {"noteId": nid, "modelName": model, "mod": mod, "tags": [], "fields": {}}
+        for nid, name, ord_, value in conn.execute(
+            f"SELECT note_id, name, ord, value FROM fields WHERE note_id IN ({marks}) ORDER BY note_id, ord", chunk
+        ):
+            result[nid]["fields"][name] = {"value": value, "order": ord_}
+        for nid, tag in conn.execute(f"SELECT note_id, tag FROM tags WHERE note_id IN ({marks}) ORDER BY note_id, tag", chunk):
+            result[nid]["tags"].append(tag)
+    return result
+
+
+def iter_notes(conn: sqlite3.Connection, note_ids: List[int], batch_size: int = NOTES_INFO_BATCH_SIZE) -> Iterator[List[dict]]:
+    """Yield mirrored notes in `note_ids` order, batch by batch, shaped like notesInfo results."""
+    for i in range(0, len(note_ids), batch_size):
+        chunk = note_ids[i:i + batch_size]
+        by_id = notes_info_map(conn, chunk)
+        yield [by_id[nid] for nid in chunk if nid in by_id]
@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, List, Optional
+
+try:
+    import orjson  # Optional fast encoder; the stdlib json module is used when missing
+except ImportError:
+    orjson = None
+
+# --- CONFIGURATION ---
+PART_FORMATS = ("json", "jsonl", "pretty")  # compact JSON array, one note per line, indented JSON array
+DEFAULT_PART_FORMAT = "json"
+
+
+def part_suffix(part_format: str) -> str:
+    return ".jsonl" if part_format == "jsonl" else ".json"
+
+
+def is_part_file(path: Path) -> bool:
+    return path.suffix in (".json", ".jsonl")
+
+
+def encode(obj: Any, pretty: bool = False, fast: Optional[bool] = None) -> bytes:
+    """Serialize one object to UTF-8 JSON, with orjson when available (fast=None) or requested."""
+    if fast is None:
+        fast = orjson is not None
+    if fast and orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class PartWriter:
+    """
+    Streams notes into one part file as they are produced, without building the part in memory.
+    "json" and "pretty" write a JSON array (so existing readers keep working); "jsonl" writes
+    one note per line. Use as a context manager; `count` and `bytes_written` are kept up to date.
+    """
+
+    def __init__(self, path: Path, part_format: str = DEFAULT_PART_FORMAT, fast: Optional[bool] = None):
+        if part_format not in PART_FORMATS:
+            raise ValueError(f"Unknown part format '{part_format}'. Must be one of: {', '.join(PART_FORMATS)}")
+        self.path = path
+        self.part_format = part_format
+        self.fast = fast
+        self.count = 0
+        self.bytes_written = 0
+        self._file: BinaryIO = open(path, "wb")
+        if part_format != "jsonl":
+            self._write(b"[")
+
+    def __enter__(self) -> "PartWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def write(self, note: dict):
+        if self.part_format == "jsonl":
+            self._write(encode(note, fast=self.fast) + b"\n")
+        elif self.part_format == "pretty":
+            # Indent each note one level so the whole file reads like json.dump(..., indent=2)
+            body = encode(note, pretty=True, fast=self.fast).replace(b"\n", b"\n  ")
+            self._write((b",\n  " if self.count else b"\n  ") + body)
+        else:
+            self._write((b"," if self.count else b"") + encode(note, fast=self.fast))
+        self.count += 1
+
+    def flush(self):
+        """Push written notes to disk so readers (or a crash) see them before the part is closed."""
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.part_format == "pretty":
+            self._write(b"\n]" if self.count else b"]")
+        elif self.part_format == "json":
+            self._write(b"]")
+        self._file.close()
+
+
+def loads_part(text: str, jsonl: bool = False) -> List[Any]:
+    """Parse part file contents (a JSON array/object, or JSON lines when `jsonl`) as a list."""
+    if jsonl:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    data = json.loads(text)
+    return data if isinstance(data, list) else [data]
+
+
+def read_part(path: Path) -> List[Any]:
+    """Load a part file written in any of PART_FORMATS (or by hand) as a list."""
+    with open(path, "r", encoding="utf-8") as f:
+        return loads_part(f.read(), jsonl=Path(path).suffix == ".jsonl")
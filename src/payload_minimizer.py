@@ -0,0 +1,54 @@
+import html
+import re
+from typing import Any, Dict, List, Tuple
+
+from token_budget import estimate_prompt_tokens
+
+# --- CONFIGURATION ---
+KEEP_EMPTY_FIELDS = {"noteId"}  # Never dropped, even when empty
+
+# Anki HTML -> plain text. Line breaks and super/subscripts carry meaning in questions, so they are kept as text.
+_BREAK_TAGS = re.compile(r"<\s*(br|/div|/p|/li|/tr|/h[1-6])\b[^>]*>", re.IGNORECASE)
+_SUP = re.compile(r"<\s*sup\b[^>]*>(.*?)<\s*/\s*sup\s*>", re.IGNORECASE | re.DOTALL)
+_SUB = re.compile(r"<\s*sub\b[^>]*>(.*?)<\s*/\s*sub\s*>", re.IGNORECASE | re.DOTALL)
+_IMG = re.compile(r"<\s*img\b[^>]*>", re.IGNORECASE)
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_STYLE_BLOCK = re.compile(r"<\s*(style|script)\b[^>]*>.*?<\s*/\s*\1\s*>", re.IGNORECASE | re.DOTALL)
+_ANY_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES = re.compile(r"\s*\n\s*")
+
+
+def minimize_text(value: str) -> str:
+    """Strip Anki HTML down to the text the model needs and collapse whitespace."""
+    if "<" not in value and "&" not in value:
+        return _BLANK_LINES.sub("\n", _SPACES.sub(" ", value.replace("\u00a0", " "))).strip()
+    text = _COMMENT.sub("", value)
+    text = _STYLE_BLOCK.sub("", text)
+    text = _SUP.sub(lambda m: "^" + m.group(1), text)
+    text = _SUB.sub(lambda m: "_" + m.group(1), text)
+    text = _IMG.sub(" [image] ", text)
+    text = _BREAK_TAGS.sub("\n", text)
+    text = _ANY_TAG.sub("", text)
+    text = html.unescape(text).replace("\u00a0", " ")
+    text = _SPACES.sub(" ", text)
+    return _BLANK_LINES.sub("\n", text).strip()
+
+
+def minimize_note(note: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of a part-file note with cleaned string fields and empty fields dropped."""
+    result: Dict[str, Any] = {}
+    for key, value in note.items():
+        if isinstance(value, str):
+            value = minimize_text(value)
+        if key not in KEEP_EMPTY_FIELDS and value in ("", [], None):
+            continue
+        result[key] = value
+    return result
+
+
+def minimize_notes(notes: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """Minimize a list of notes. Returns (notes, estimated prompt tokens saved)."""
+    minimized = [minimize_note(note) for note in notes]
+    saved = sum(estimate_prompt_tokens(a) - estimate_prompt_tokens(b) for a, b in zip(notes, minimized))
+    return minimized, saved
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+import metrics
+
+# --- CONFIGURATION ---
+WINDOW_SECONDS = 60.0  # Quotas are per minute
+
+
+class TokenBucket:
+    """
+    Bucket of `capacity` units where every spent unit flows back exactly WINDOW_SECONDS
+    after it was taken. Unlike a constant-refill bucket, the amount spent in *any*
+    rolling minute can therefore never exceed `capacity`, which is how the API counts.
+    Not thread-safe on its own; RateLimiter serializes access.
+    """
+
+    def __init__(self, capacity: float, window: float = WINDOW_SECONDS):
+        self.capacity = capacity
+        self.window = window
+        self._spent: Deque[Tuple[float, float]] = deque()  # (time taken, amount)
+        self._used = 0.0
+
+    def _expire(self, now: float):
+        while self._spent and self._spent[0][0] + self.window <= now:
+            self._used -= self._spent.popleft()[1]
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        if self.capacity <= 0:
+            return 0.0  # Unlimited
+        self._expire(now)
+        if self._used + amount <= self.capacity or not self._spent:
+            return 0.0  # An oversized request is let through alone rather than blocking forever
+        needed = self._used + amount - self.capacity
+        freed = 0.0
+        for taken_at, spent in self._spent:
+            freed += spent
+            if freed >= needed:
+                return taken_at + self.window - now
+        return self._spent[-1][0] + self.window - now
+
+    def consume(self, amount: float, now: float):
+        if self.capacity <= 0 or amount <= 0:
+            return
+        self._spent.append((now, amount))
+        self._used += amount
+
+
+class RateLimiter:
+    """Thread-safe requests-per-minute and tokens-per-minute limiter shared by concurrent workers."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request carrying `tokens` tokens fits both quotas. Returns the seconds waited."""
+        waited = 0.0
+        with metrics.span("rate_limit.wait", "wait"):
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                    if delay <= 0:
+                        self.requests.consume(1, now)
+                        self.tokens.consume(tokens, now)
+                        return waited
+                time.sleep(delay)
+                waited += delay
+
+    def record_tokens(self, tokens: int):
+        """Charge tokens only known after the call (e.g. the response) without waiting."""
+        with self._lock:
+            self.tokens.consume(tokens, time.monotonic())
@@ -0,0 +1,148 @@
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+from candidate_filter import VALID_ANSWERS, needs_solution
+
+# --- CONFIGURATION ---
+# Field each processing mode has to fill in an output object
+RESULT_FIELDS = {"tag": "newTag", "answer": "Answer", "solution": "Solution"}
+# Modes whose instructions let the model leave notes out (tag already valid, answer already right).
+# In the combined "all" mode only notes flagged as needing a Solution must come back.
+MAY_SKIP_NOTES = {"tag", "answer"}
+MAX_FOLLOWUP_CALLS = 16      # Per part; bisecting n stubborn notes takes about 2n calls
+ATTEMPTS_PER_NOTE = 2        # A single note is given up after this many follow-ups without an answer
+
+_NOTE_ID = re.compile(r'"noteId"\s*:\s*"?(\d+)')
+
+
+def note_key(note: dict) -> str:
+    # The model sometimes quotes the ID, so notes and objects are matched on str(noteId)
+    return str(note.get("noteId"))
+
+
+def is_valid_object(obj: dict, mode: str) -> bool:
+    """Whether an output object carries a usable answer for `mode`."""
+    if mode == "all":
+        # Every field is optional (see answers_note), but must be usable when present
+        return all(is_valid_object(obj, part) for part, field in RESULT_FIELDS.items() if field in obj)
+    field = RESULT_FIELDS.get(mode)
+    if field is None:
+        return True
+    value = obj.get(field)
+    if mode == "answer":
+        return str(value).strip() in VALID_ANSWERS
+    return isinstance(value, str) and bool(value.strip())
+
+
+def note_ids_in(segments: Iterable[str]) -> Set[str]:
+    """noteIds still readable in malformed output objects, so those notes can be asked again."""
+    ids: Set[str] = set()
+    for segment in segments:
+        match = _NOTE_ID.search(segment)
+        if match:
+            ids.add(match.group(1))
+    return ids
+
+
+def split_valid(objects: List[dict], mode: str) -> Tuple[List[dict], Set[str]]:
+    """Returns (usable objects, noteIds of objects that were unusable)."""
+    valid: List[dict] = []
+    invalid: Set[str] = set()
+    for obj in objects:
+        if "noteId" in obj and is_valid_object(obj, mode):
+            valid.append(obj)
+        else:
+            invalid.add(str(obj.get("noteId")))
+    return valid, invalid
+
+
+def answers_note(obj: dict, note: dict, mode: str) -> bool:
+    # In "all" mode a note flagged as needing a Solution is only answered by an object with one
+    return mode != "all" or not needs_solution(note) or RESULT_FIELDS["solution"] in obj
+
+
+def may_skip(note: dict, mode: str) -> bool:
+    return mode in MAY_SKIP_NOTES or (mode == "all" and not needs_solution(note))
+
+
+def unanswered_notes(notes: List[dict], objects: List[dict], mode: str, complete: bool, suspect_ids: Set[str]) -> List[dict]:
+    """
+    Notes of a request that still need an answer after the model replied with `objects`
+    (already filtered by split_valid). A note is unanswered if its object was malformed or
+    unusable (`suspect_ids`) or if it is missing where a missing note cannot be a deliberate
+    skip: in modes that answer every note, or after the last answered note of a truncated reply.
+    """
+    by_id: Dict[str, List[dict]] = {}
+    for obj in objects:
+        by_id.setdefault(str(obj["noteId"]), []).append(obj)
+    answered = {note_key(note) for note in notes if any(answers_note(obj, note, mode) for obj in by_id.get(note_key(note), []))}
+    last_answered = max((i for i, note in enumerate(notes) if note_key(note) in answered), default=-1)
+    result = []
+    for i, note in enumerate(notes):
+        key = note_key(note)
+        if key in answered:
+            continue
+        if key in suspect_ids or not may_skip(note, mode) or (not complete and i > last_answered):
+            result.append(note)
+    return result
+
+
+def drop_unrequested(objects: List[dict], notes: List[dict], mode: str) -> List[dict]:
+    """
+    In "all" mode, remove a Solution the model wrote for a note that did not ask for one (its
+    existing Solution was not sent, so it would be overwritten blindly), then drop objects left
+    with nothing to write.
+    """
+    if mode != "all":
+        return objects
+    keep_solution = {note_key(note) for note in notes if needs_solution(note)}
+    result = []
+    for obj in objects:
+        if str(obj.get("noteId")) not in keep_solution:
+            obj = {k: v for k, v in obj.items() if k != RESULT_FIELDS["solution"]}
+        if any(field in obj for field in RESULT_FIELDS.values()):
+            result.append(obj)
+    return result
+
+
+def bisect(notes: List[dict]) -> List[List[dict]]:
+    middle = len(notes) // 2
+    return [notes[:middle], notes[middle:]]
+
+
+class FollowUpQueue:
+    """
+    Work list of follow-up requests for one part. A request that makes progress is followed
+    by one for whatever is still unanswered; a request that makes none is split in halves, so
+    a note that keeps breaking the output ends up alone and costs only its own tokens.
+    """
+
+    def __init__(self, notes: List[dict], max_calls: int = MAX_FOLLOWUP_CALLS):
+        self.pending: List[List[dict]] = [notes] if notes else []
+        self.calls_left = max_calls
+        self.attempts: Dict[str, int] = {}
+        self.given_up: List[dict] = []
+
+    def next(self) -> List[dict]:
+        if not self.pending or self.calls_left <= 0:
+            self.given_up.extend(note for group in self.pending for note in group)
+            self.pending = []
+            return []
+        self.calls_left -= 1
+        group = self.pending.pop(0)
+        for note in group:
+            self.attempts[note_key(note)] = self.attempts.get(note_key(note), 0) + 1
+        return group
+
+    def report(self, group: List[dict], still_unanswered: List[dict]):
+        """Queue what is left of `group` after its follow-up request."""
+        if not still_unanswered:
+            return
+        if len(still_unanswered) < len(group):
+            self.pending.append(still_unanswered)
+        elif len(group) > 1:
+            self.pending.extend(bisect(group))
+        elif self.attempts[note_key(group[0])] < ATTEMPTS_PER_NOTE:
+            self.pending.append(group)
+        else:
+            self.given_up.extend(group)
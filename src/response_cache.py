@@ -0,0 +1,113 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import metrics
+
+# --- CONFIGURATION ---
+CACHE_PATH = Path("./data/cache/responses.sqlite3")  # Next to the note mirror
+MAX_CACHE_BYTES = 256 * 1024 * 1024                  # Least recently used entries are evicted beyond this
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key       TEXT PRIMARY KEY,
+    kind      TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+"""
+
+
+def cache_key(*parts: Any) -> str:
+    """Content address: SHA-256 over the JSON of everything that determines the model's answer."""
+    data = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of parsed model output, keyed by content hash. Entries are either a
+    whole chunk ("chunk") or the objects returned for a single note ("note").
+    Safe to share between worker threads. Hit/miss counts are kept per kind.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Running size of all entries: read once here, then kept up to date by put() and _evict()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, kind: str, outcome: str):
+        entry = self.stats.setdefault(kind, {"hits": 0, "misses": 0, "stores": 0})
+        entry[outcome] += 1
+        metrics.count(f"cache.{kind}.{outcome}")
+
+    def get(self, key: str, kind: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(kind, "misses")
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._count(kind, "hits")
+            return json.loads(row[0])
+
+    def put(self, key: str, kind: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            with self._conn:
+                self._conn.execute(
+                    """
+                    INSERT INTO responses (key, kind, value, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, last_used = excluded.last_used
+                    """,
+                    (key, kind, data, size, now, now),
+                )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._count(kind, "stores")
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        excess = self._total_bytes - self.max_bytes
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            doomed.append((key,))
+            excess -= size
+            self._total_bytes -= size
+            if excess <= 0:
+                break
+        with self._conn:
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def format_stats(self) -> str:
+        parts = [f"{kind}: {s['hits']} hit(s), {s['misses']} miss(es), {s['stores']} stored" for kind, s in sorted(self.stats.items())]
+        return "; ".join(parts or ["no lookups"]) + f" ({self.size_bytes() / (1024 * 1024):.1f} MB on disk)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,102 @@
+import json
+import re
+from typing import List
+
+# Characters that can change the parser state; everything else is skipped in one regex jump
+_SPECIAL = re.compile(r'[\\"{}\[\]]')
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a streamed JSON array of objects, e.g. a model response
+    arriving chunk by chunk (a surrounding ```json fence or prose is ignored).
+    feed() returns every top-level object completed by the new text. Braces inside
+    strings and escaped quotes are handled; an object that fails to decode is
+    counted in `malformed` (its text kept in `malformed_texts`) and skipped.
+    Otherwise only the unfinished object is kept in memory.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0            # Scan position in _buffer
+        self._obj_start = -1     # Start of the object being read, -1 between objects
+        self._depth = 0          # Nesting depth inside the current object
+        self._in_string = False
+        self._escape = False
+        self.started = False     # Seen the opening '['
+        self.finished = False    # Seen the closing ']'
+        self.count = 0
+        self.malformed = 0
+        self.malformed_texts: List[str] = []
+
+    def feed(self, text: str) -> List[dict]:
+        if self.finished or not text:
+            return []
+        buf = self._buffer + text
+        i = self._pos
+        completed: List[dict] = []
+
+        if not self.started:
+            start = buf.find("[", i)
+            if start < 0:
+                self._buffer, self._pos = "", 0
+                return []
+            self.started = True
+            i = start + 1
+
+        n = len(buf)
+        while i < n:
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+            match = _SPECIAL.search(buf, i)
+            if match is None:
+                i = n
+                break
+            i = match.start()
+            c = buf[i]
+            if self._in_string:
+                if c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif self._obj_start < 0:
+                # Between objects: only '{' (next object) and ']' (end of array) matter
+                if c == "{":
+                    self._obj_start = i
+                    self._depth = 1
+                elif c == "]":
+                    self.finished = True
+                    break
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        # strict=False: models sometimes put raw newlines inside strings
+                        obj = json.loads(buf[self._obj_start:i + 1], strict=False)
+                        if isinstance(obj, dict):
+                            completed.append(obj)
+                            self.count += 1
+                    except json.JSONDecodeError:
+                        self.malformed += 1
+                        self.malformed_texts.append(buf[self._obj_start:i + 1])
+                    self._obj_start = -1
+            i += 1
+
+        # Keep only the unfinished object (if any) for the next feed
+        if self._obj_start >= 0:
+            self._buffer = buf[self._obj_start:]
+            self._pos = i - self._obj_start
+            self._obj_start = 0
+        else:
+            self._buffer, self._pos = "", 0
+        return completed
+
+    def unfinished(self) -> str:
+        """Text of the object still being read (e.g. the tail of a truncated response), or ''."""
+        return self._buffer if self._obj_start >= 0 else ""
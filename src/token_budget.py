@@ -0,0 +1,86 @@
+import json
+import math
+from typing import Optional
+
+# --- CONFIGURATION ---
+CHARS_PER_TOKEN = 4.0          # Rough Gemini average for mixed English/markup text
+DEFAULT_TOKEN_BUDGET = 12000   # Estimated prompt + response tokens per part file (0 disables the budget)
+RESPONSE_TOKEN_LIMIT = 8000    # Keep expected output well under the model's output cap to avoid truncation
+RESPONSE_OVERHEAD_TOKENS = 12  # Per-object JSON scaffolding in the response: {"noteId": ..., ...}
+# Expected response size per note for each generation mode: (fixed tokens, fraction of the note's own tokens)
+RESPONSE_TOKENS_BY_MODE = {
+    "tag": (15, 0.0),
+    "answer": (10, 0.0),
+    "solution": (120, 0.6),
+    "all": (145, 0.6),  # tag + answer + solution in one object
+}
+DEFAULT_RESPONSE_ESTIMATE = (60, 0.3)  # Used when the generation mode is not known at fetch time
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, tokenizer-free token estimate for a piece of prompt text."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_prompt_tokens(note: dict) -> int:
+    """Tokens the note adds to the prompt, as serialized into the part file."""
+    return estimate_tokens(json.dumps(note, ensure_ascii=False, separators=(",", ":")))
+
+
+def estimate_response_tokens(note: dict, mode: Optional[str] = None, prompt_tokens: Optional[int] = None) -> int:
+    """Tokens the model is expected to write back for this note in `mode`."""
+    if prompt_tokens is None:
+        prompt_tokens = estimate_prompt_tokens(note)
+    base_mode = mode.split(":")[0] if mode else None  # solution:meaning -> solution
+    fixed, ratio = RESPONSE_TOKENS_BY_MODE.get(base_mode, DEFAULT_RESPONSE_ESTIMATE)
+    return RESPONSE_OVERHEAD_TOKENS + fixed + math.ceil(prompt_tokens * ratio)
+
+
+class PartPacker:
+    """
+    Decides when the current part file is full: the estimated prompt + response tokens
+    stay under `token_budget`, the expected response under `response_limit`, and the
+    note count under `max_notes`. A single oversized note still gets a part of its own.
+    """
+
+    def __init__(
+        self,
+        max_notes: int,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        response_limit: int = RESPONSE_TOKEN_LIMIT,
+        mode: Optional[str] = None,
+    ):
+        self.max_notes = max(1, max_notes)
+        self.token_budget = token_budget
+        self.response_limit = response_limit
+        self.mode = mode
+        self.reset()
+
+    def reset(self):
+        self.notes = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+
+    def cost(self, note: dict) -> tuple:
+        prompt = estimate_prompt_tokens(note)
+        return prompt, estimate_response_tokens(note, self.mode, prompt)
+
+    def fits(self, cost: tuple) -> bool:
+        if self.notes == 0:
+            return True
+        if self.notes >= self.max_notes:
+            return False
+        if self.token_budget <= 0:
+            return True
+        prompt, response = cost
+        if self.prompt_tokens + self.response_tokens + prompt + response > self.token_budget:
+            return False
+        return self.response_tokens + response <= self.response_limit
+
+    def add(self, cost: tuple):
+        prompt, response = cost
+        self.notes += 1
+        self.prompt_tokens += prompt
+        self.response_tokens += response
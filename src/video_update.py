@@ -167,9 +167,10 @@ import shutil
 import requests
 import typer
 from typing import Annotated
+from anki_client import get_client, AnkiConnectError
+import note_mirror
 
 # --- Configuration ---
-ANKI_URL = 'http://localhost:8765'
 TEMP_DIR = r"D:\Media\Recordings\temp"
 BASE_RECORDINGS_DIR = r"D:\Media\Recordings"
 DECK_NAME = "00-OTHERS"
@@ -177,20 +178,18 @@ DECK_NAME = "00-OTHERS"
 app = typer.Typer()
 
 def invoke(action, **params):
-    payload = {"action": action, "version": 6, "params": params}
     try:
-        response = requests.post(ANKI_URL, json=payload).json()
+        return get_client().request(action, params)
     except requests.exceptions.ConnectionError:
         typer.secho("Error: Anki is not running. Open Anki first.", fg=typer.colors.RED)
         raise typer.Exit(code=1)
-    
-    if response.get('error'):
-        raise Exception(f"Anki Error: {response['error']}")
-    return response['result']
+    except AnkiConnectError as e:
+        raise Exception(f"Anki Error: {e}")
 
 @app.command()
 def process(
-    subject: Annotated[str, typer.Option("--subject", "-s", help="Subject folder (MATH or GI)")]
+    subject: Annotated[str, typer.Option("--subject", "-s", help="Subject folder (MATH or GI)")],
+    mirror: Annotated[bool, typer.Option("--mirror", help="Read note tags from the local SQLite mirror (refreshing only changed notes)")] = False,
 ):
     subject_upper = subject.upper()
     dest_dir = os.path.join(BASE_RECORDINGS_DIR, subject_upper)
@@ -231,9 +230,15 @@ def process(
         raise typer.Exit(code=1)
 
     # 4. Fetch Note info in bulk for tag checking
-    notes_data = invoke('notesInfo', notes=note_ids)
-    # Create a lookup dictionary for easy access by noteId
-    notes_lookup = {n['noteId']: n for n in notes_data}
+    if mirror:
+        conn = note_mirror.connect()
+        note_mirror.refresh_deck(conn, DECK_NAME, note_ids=note_ids)
+        notes_lookup = note_mirror.notes_info_map(conn, note_ids)
+        conn.close()
+    else:
+        notes_data = invoke('notesInfo', notes=note_ids)
+        # Create a lookup dictionary for easy access by noteId
+        notes_lookup = {n['noteId']: n for n in notes_data}
 
     # 5. Process loop
     os.makedirs(dest_dir, exist_ok=True)
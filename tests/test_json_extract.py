@@ -0,0 +1,38 @@
+import json
+
+from json_extract import extract_objects, extract_with_errors
+
+MANY_SETS = ", ".join("{%d}" % i for i in range(30))
+
+
+def test_set_notation_inside_strings_does_not_split_objects():
+    text = '[{"noteId":1,"Solution":"%s"},{"noteId":2,"Solution":"ok"}]' % MANY_SETS
+    objects, malformed = extract_with_errors(text)
+    assert [obj["noteId"] for obj in objects] == [1, 2]
+    assert malformed == []
+
+
+def test_malformed_element_is_reported_once_and_the_next_one_kept():
+    broken = '{"noteId":2,"Solution":"a "key" step}, {x}"}'
+    text = '```json\n[{"noteId":1,"Solution":"%s"},\n%s,\n{"noteId":3,"Solution":"ok"}]\n```' % (MANY_SETS, broken)
+    objects, malformed = extract_with_errors(text)
+    assert [obj["noteId"] for obj in objects] == [1, 3]
+    assert malformed == [broken]
+
+
+def test_truncated_last_element_is_malformed():
+    objects, malformed = extract_with_errors('[{"noteId":1},{"noteId":2,"Solution":"cut off')
+    assert [obj["noteId"] for obj in objects] == [1]
+    assert len(malformed) == 1 and malformed[0].startswith('{"noteId":2')
+
+
+def test_no_array():
+    assert extract_objects("[]") == ([], 0)
+    assert extract_objects("no json here") == ([], 0)
+
+
+def test_many_objects_with_many_boundaries_in_strings():
+    objects = [{"noteId": i, "Solution": MANY_SETS} for i in range(2000)]
+    text = json.dumps(objects)[:-1] + ', {"noteId": -1, "Solution": "a "b" c"}]'
+    found, skipped = extract_objects(text)
+    assert found == objects and skipped == 1